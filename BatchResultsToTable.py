@@ -0,0 +1,111 @@
+import argparse
+import json
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import ResultsToTable
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run ResultsToTable.py for every series in a manifest in one process, or across a pool of processes. Please see README.md for complete usage.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required_args = parser.add_argument_group(title="Required Arguments")
+    required_args.add_argument("--manifest", required=True, type=str,
+                               help='JSON file listing the series to run and their ResultsToTable.py settings. (e.x. "simresults/manifest.json")')
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--jobs", type=int, default=1,
+                               help="Number of processes to run the series with. Series are run one after another in this process when 1.")
+    optional_args.add_argument("--quiet", action="store_true",
+                               help="Only log warnings and errors, not progress.")
+    optional_args.add_argument("--verbose", action="store_true",
+                               help="Also log every table read, cleaned, cached and computed.")
+
+    return parser.parse_args()
+
+
+# Manifest is a JSON list of series, each an object of ResultsToTable.py arguments by their dest name
+# (e.x. {"series": "simresults/MX5", "sessions": ["Qualify result", "Race 1 result"], "rounds_to_include": 8, "drop_week": true})
+def read_manifest(manifest_file):
+    with open(manifest_file) as fp:
+        manifest = json.load(fp)
+    assert isinstance(manifest, list), "manifest {} should be a list of series".format(manifest_file)
+    for entry in manifest:
+        assert isinstance(entry, dict) and "series" in entry, "manifest entry {} has no series".format(entry)
+    return manifest
+
+
+# Parse a manifest entry as ResultsToTable.py arguments, so its settings get the same type, nargs and choices checks as
+# the command line and its missing settings the same defaults
+# Lists are given for nargs arguments, true or false for flags, and outputs for --only as a list or comma separated
+def get_series_args(entry):
+    parser = ResultsToTable.get_parser()
+    parser.exit_on_error = False
+    actions = {action.dest: action for action in parser._actions if action.option_strings}
+    for action in actions.values():
+        if action.required and action.dest not in entry:
+            raise ValueError("manifest entry for {} is missing '{}'".format(entry["series"], action.dest))
+
+    argv = []
+    for key, value in entry.items():
+        if key not in actions or key == "help":
+            raise ValueError("manifest entry for {} has unknown setting '{}'".format(entry["series"], key))
+        action = actions[key]
+        if action.nargs == 0:
+            if not isinstance(value, bool):
+                raise ValueError("manifest entry for {} setting '{}' should be true or false: {}".format(
+                    entry["series"], key, value))
+            if value:
+                argv.append(action.option_strings[0])
+            continue
+        if key == "only" and isinstance(value, list):
+            value = ",".join(value)
+        values = value if isinstance(value, list) and action.nargs in ["+", "*"] else [value]
+        argv += [action.option_strings[0], *[str(value) for value in values]]
+    return parser.parse_args(argv)
+
+
+# Run one series, any error is returned instead of raised so the rest of the batch still runs, including a setting
+# argparse rejects by exiting
+# Module level so it can be sent to pool processes, which keep their imports and parsed series tables between series
+def run_series(entry):
+    start_time = time.perf_counter()
+    try:
+        ResultsToTable.run(get_series_args(entry))
+        error = None
+    except (Exception, SystemExit) as e:
+        traceback.print_exc()
+        error = "{}: {}".format(type(e).__name__, e)
+    return entry["series"], error, time.perf_counter() - start_time
+
+
+def run(args):
+    manifest = read_manifest(args.manifest)
+
+    if args.jobs > 1 and len(manifest) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(manifest))) as executor:
+            results = list(executor.map(run_series, manifest))
+    else:
+        results = [run_series(entry) for entry in manifest]
+
+    print("batch results:")
+    num_failed = 0
+    for series, error, elapsed in results:
+        if error is None:
+            print("  {}: ok ({:.2f}s)".format(series, elapsed))
+        else:
+            num_failed += 1
+            print("  {}: FAILED ({:.2f}s) {}".format(series, elapsed, error))
+    print("{} of {} series succeeded".format(len(results) - num_failed, len(results)))
+
+    return num_failed
+
+
+if __name__ == '__main__':
+    parsed_args = parse_args()
+    ResultsToTable.configure_logging(parsed_args)
+    sys.exit(1 if run(parsed_args) else 0)
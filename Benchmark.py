@@ -0,0 +1,298 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from Championship import Championship
+from DriversStandingsWriter import DriversStandingsWriter
+from ParticipationTableWriter import ParticipationTableWriter
+from RaceReport import RaceReport
+from RaceReportWriter import RaceReportWriter
+from SeasonGenerator import SeasonGenerator
+from SimresultsFile import SimresultsFile
+from SummaryTableWriter import SummaryTableWriter
+from TableWriter import TableRenderCache
+from TeamsStandingsWriter import TeamsStandingsWriter
+
+# Modules the command line shouldn't import until it has tables to compute, they're most of its startup time
+heavy_modules = ["pandas", "numpy"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Time each stage of the championship pipeline on generated series of several sizes, and save the timings to JSON to compare between versions.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--sizes", nargs="+", default=["20x8", "50x16", "100x32"],
+                               help="Series sizes to benchmark as DRIVERSxROUNDS.")
+    optional_args.add_argument("--races", type=int, default=2, help="Number of races per round after qualifying.")
+    optional_args.add_argument("--laps", type=int, default=20, help="Number of laps per race.")
+    optional_args.add_argument("--repeat", type=int, default=3,
+                               help="Times to run each stage, the fastest run is reported.")
+    optional_args.add_argument("--output", type=str, default="benchmark.json", help="JSON file to save timings to.")
+    optional_args.add_argument("--compare", type=str, help="JSON file saved by an earlier benchmark to compare timings with.")
+    optional_args.add_argument("--work-directory", type=str,
+                               help="Directory to generate series in, kept after the benchmark. (default: a temporary directory)")
+    optional_args.add_argument("--startup-budget", type=float, default=0.25,
+                               help="Seconds ResultsToTable.py may take to print its help or to find a series' outputs up to date, the benchmark fails when it's over or when those runs import pandas or numpy.")
+    optional_args.add_argument("--startup-only", action="store_true",
+                               help="Only time the command line's startup, not the pipeline stages.")
+
+    return parser.parse_args()
+
+
+# Fastest of repeat runs of a stage in seconds, setup is run untimed before each run
+def time_stage(stage, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start_time = time.perf_counter()
+        stage()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def benchmark_series(series_directory, session_names, num_rounds, repeat):
+    stages = {}
+    tracks = ["round_{:02d}".format(i + 1) for i in range(num_rounds)]
+    results_files = [os.path.join(series_directory, track, file) for track in tracks for file in
+                     os.listdir(os.path.join(series_directory, track)) if file.endswith(".csv")]
+
+    stages["csv_section_scan"] = time_stage(lambda: [SimresultsFile(file) for file in results_files], repeat)
+
+    race_reports = [RaceReport(session_names, series_directory, track) for track in tracks]
+
+    def read_results_tables():
+        for race_report in race_reports:
+            race_report.tables = race_report._read_results_tables()
+
+    stages["read_results_tables"] = time_stage(read_results_tables, repeat)
+    stages["clean_results_tables"] = time_stage(lambda: [race_report._clean_results_tables() for race_report in
+                                                         race_reports], repeat, setup=read_results_tables)
+
+    # championship tables are computed when first used, so the stage uses all of them
+    def build_championship():
+        championship = Championship(series_directory, session_names, num_rounds, drop_week=True)
+        for table in ["teams_and_drivers_table", "teams_totals_table", "drivers_participation_table", "summary_table"]:
+            getattr(championship, table)
+        return championship
+
+    stages["championship"] = time_stage(build_championship, repeat)
+    championship = build_championship()
+    included_tracks = championship.series_tracks_table.index[0:num_rounds]
+
+    stages["construct_drivers_points"] = time_stage(lambda: championship._construct_drivers_points(included_tracks),
+                                                    repeat)
+    points_table = championship._all_drivers_points_table
+    stages["drivers_totals_and_countback"] = time_stage(
+        lambda: (championship._construct_drivers_totals(points_table), championship._get_countback_matrix(points_table)),
+        repeat)
+    stages["teams_totals"] = time_stage(
+        lambda: (championship._construct_teams_weekend_totals(included_tracks),
+                 championship._construct_teams_totals(championship.drivers_totals_table)), repeat)
+
+    def construct_standings():
+        for table in ["drivers_totals_table", "drivers_points_table", "teams_and_drivers_table", "teams_totals_table",
+                      "drivers_participation_table"]:
+            getattr(championship, table)
+
+    stages["standings"] = time_stage(construct_standings, repeat, setup=lambda: championship._invalidate_dependent_tables(
+        ["_all_drivers_totals_table", "_all_drivers_countback_matrix", "_all_drivers_participation_table",
+         "_teams_weekend_totals_tables"]))
+
+    # writers are timed from a cold render cache, as in a normal run
+    def clear_render_cache():
+        TableRenderCache._render_caches.pop(championship, None)
+
+    for writer_class in [DriversStandingsWriter, TeamsStandingsWriter, SummaryTableWriter, ParticipationTableWriter]:
+        stages[writer_class.__name__] = time_stage(lambda: list(writer_class(championship)._generate_lines()), repeat,
+                                                   setup=clear_render_cache)
+
+    def generate_race_reports():
+        for race_report in championship.race_reports.values():
+            race_report_writer = RaceReportWriter(race_report)
+            for name in race_report.session_names:
+                list(race_report_writer.generate_table_lines(name))
+
+    stages[RaceReportWriter.__name__] = time_stage(generate_race_reports, repeat)
+
+    return stages
+
+
+# Time of a run of ResultsToTable.py in a new interpreter in seconds, and its result
+def run_command(command_args, python_args=()):
+    command = [sys.executable] + list(python_args) + [
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "ResultsToTable.py")] + command_args
+    start_time = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True)
+    seconds = time.perf_counter() - start_time
+    assert result.returncode == 0, "{} failed: {}".format(" ".join(command), result.stderr[-1000:])
+    return seconds, result
+
+
+# Fastest of repeat runs of ResultsToTable.py in a new interpreter in seconds, and the heavy modules it imported as
+# reported by python -X importtime
+def time_command(command_args, repeat):
+    timings = []
+    for _ in range(repeat):
+        seconds, result = run_command(command_args, ["-X", "importtime"])
+        timings.append(seconds)
+
+    imported_modules = [line.split("|")[-1].strip() for line in result.stderr.splitlines() if
+                        line.startswith("import time:")]
+    return min(timings), [module for module in heavy_modules if module in imported_modules]
+
+
+# Cold start of the command line, printing its help and a rerun that finds every output already up to date
+def benchmark_startup(series_directory, session_names, num_rounds, repeat):
+    series_args = ["--series", series_directory, "--sessions"] + session_names + [
+        "--rounds-to-include", str(num_rounds), "--write-race-reports", "--quiet"]
+    time_command(series_args, 1)
+
+    stages = {}
+    heavy_imports = {}
+    stages["cli_help"], heavy_imports["cli_help"] = time_command(["--help"], repeat)
+    stages["cli_up_to_date"], heavy_imports["cli_up_to_date"] = time_command(series_args, repeat)
+    return stages, heavy_imports
+
+
+# Fastest of repeat runs that add the last round to a --state-file saved one round short of it, and the fewest stored
+# tables those runs loaded with the state, every one of Championship.state_tables should be reused
+def benchmark_state(series_directory, session_names, num_rounds, repeat):
+    state_file = os.path.join(series_directory, "benchmark_state.pickle")
+    series_args = ["--series", series_directory, "--sessions"] + session_names + ["--state-file", state_file,
+                                                                                  "--force"]
+    timings = []
+    reused_tables = []
+    for _ in range(repeat):
+        if os.path.isfile(state_file):
+            os.remove(state_file)
+        run_command(series_args + ["--rounds-to-include", str(num_rounds - 1), "--quiet"])
+        seconds, result = run_command(series_args + ["--rounds-to-include", str(num_rounds)])
+        timings.append(seconds)
+        loaded_state = re.search(r"loaded championship state with (\d+) stored tables", result.stderr)
+        reused_tables.append(int(loaded_state.group(1)) if loaded_state else 0)
+    os.remove(state_file)
+    return min(timings), min(reused_tables)
+
+
+# Sizes whose --state-file run didn't reuse every stored table
+def get_state_failures(results):
+    failures = []
+    for result in results:
+        if "state_reused_tables" in result and result["state_reused_tables"] < len(Championship.state_tables):
+            failures.append("{}x{}: reused {} of {} stored tables".format(
+                result["drivers"], result["rounds"], result["state_reused_tables"], len(Championship.state_tables)))
+    return failures
+
+
+# Startup stages over the budget and ones that imported heavy modules
+def get_startup_failures(results, startup_budget):
+    failures = []
+    for result in results:
+        for stage, heavy_imports in result["heavy_imports"].items():
+            size = "{}x{}".format(result["drivers"], result["rounds"])
+            if result["stages"][stage] > startup_budget:
+                failures.append("{} {}: {:.3f}s over the {:.3f}s budget".format(size, stage, result["stages"][stage],
+                                                                                  startup_budget))
+            if heavy_imports:
+                failures.append("{} {}: imported {}".format(size, stage, ", ".join(heavy_imports)))
+    return failures
+
+
+def get_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_comparison(results, compare_file):
+    with open(compare_file) as fp:
+        compare_results = {(result["drivers"], result["rounds"]): result["stages"] for result in
+                           json.load(fp)["results"]}
+
+    print("comparison with {} (new/old time):".format(compare_file))
+    for result in results:
+        old_stages = compare_results.get((result["drivers"], result["rounds"]))
+        if old_stages is None:
+            print("  {}x{}: not in {}".format(result["drivers"], result["rounds"], compare_file))
+            continue
+        print("  {}x{}:".format(result["drivers"], result["rounds"]))
+        for stage, seconds in result["stages"].items():
+            if stage in old_stages and old_stages[stage] > 0:
+                print("    {:<30} {:>6.2f}x".format(stage, seconds / old_stages[stage]))
+
+
+def run(args):
+    work_directory = args.work_directory or tempfile.mkdtemp(prefix="simresults_benchmark_")
+    results = []
+    try:
+        for size in args.sizes:
+            num_drivers, num_rounds = [int(n) for n in size.lower().split("x")]
+            generator = SeasonGenerator(num_drivers, num_rounds, args.races, args.laps)
+            series_directory = os.path.join(work_directory, "GEN_{}".format(size))
+            if not os.path.isdir(series_directory):
+                generator.generate(series_directory)
+
+            print("benchmarking {} drivers, {} rounds".format(num_drivers, num_rounds))
+            stages = {}
+            result = {"drivers": num_drivers, "rounds": num_rounds, "races": args.races, "laps": args.laps}
+            if not args.startup_only:
+                stages.update(benchmark_series(series_directory, generator.session_names, num_rounds, args.repeat))
+                stages["cli_state_add_round"], result["state_reused_tables"] = benchmark_state(
+                    series_directory, generator.session_names, num_rounds, args.repeat)
+            startup_stages, heavy_imports = benchmark_startup(series_directory, generator.session_names, num_rounds,
+                                                              args.repeat)
+            stages.update(startup_stages)
+            for stage, seconds in stages.items():
+                print("  {:<30} {:>9.4f}s".format(stage, seconds))
+
+            result.update({"stages": stages, "heavy_imports": heavy_imports})
+            results.append(result)
+    finally:
+        if not args.work_directory:
+            shutil.rmtree(work_directory)
+
+    benchmark = {"version": get_version(),
+                 "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(),
+                 "pandas": pd.__version__,
+                 "numpy": np.__version__,
+                 "repeat": args.repeat,
+                 "startup_budget": args.startup_budget,
+                 "results": results}
+    with open(args.output, "w") as fp:
+        json.dump(benchmark, fp, indent=2)
+    print("saved benchmark:", args.output)
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+    startup_failures = get_startup_failures(results, args.startup_budget)
+    for failure in startup_failures:
+        print("startup budget failed:", failure)
+    state_failures = get_state_failures(results)
+    for failure in state_failures:
+        print("state reuse failed:", failure)
+    return len(startup_failures) + len(state_failures)
+
+
+if __name__ == "__main__":
+    # the pipeline's progress logging would dominate the timings
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    sys.exit(1 if run(parse_args()) else 0)
@@ -1,24 +1,59 @@
+import functools
+import logging
 import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
 
+import Profiling
 import Utils
 from RaceReport import RaceReport
 
+logger = logging.getLogger(__name__)
 
-class Championship:
 
+class Championship:
+    # Bump when the saved state layout changes so states saved by older code are recomputed
+    state_version = 2
+
+    # Lazily computed tables and the tables they are computed from, in the order they can be computed in
+    # The _all_drivers tables hold every series driver in drivers table order so rounds can be added to them
+    # incrementally, the standings tables are derived from them for only the drivers that have participated
+    table_dependencies = {
+        "_all_drivers_points_table": [],
+        "_all_drivers_totals_table": ["_all_drivers_points_table"],
+        "_all_drivers_countback_matrix": ["_all_drivers_points_table"],
+        "_all_drivers_participation_table": ["_all_drivers_points_table"],
+        "_teams_weekend_totals_tables": ["_all_drivers_points_table", "_all_drivers_totals_table"],
+        "summary_table": [],
+        "_drivers_standings_order": ["_all_drivers_points_table", "_all_drivers_totals_table",
+                                     "_all_drivers_countback_matrix"],
+        "drivers_totals_table": ["_all_drivers_totals_table", "_all_drivers_countback_matrix",
+                                 "_drivers_standings_order"],
+        "drivers_points_table": ["_all_drivers_points_table", "_drivers_standings_order"],
+        "teams_and_drivers_table": ["drivers_totals_table"],
+        "teams_totals_table": ["_teams_weekend_totals_tables", "drivers_totals_table"],
+        "drivers_participation_table": ["_all_drivers_participation_table", "drivers_points_table"],
+    }
+    # Tables add_round adds rounds to, save_state computes them so a loaded state only reads its new rounds
+    state_tables = ["_all_drivers_points_table", "_all_drivers_totals_table", "_all_drivers_countback_matrix",
+                    "_all_drivers_participation_table", "_teams_weekend_totals_tables", "summary_table"]
+
+    @Profiling.timed("championship")
     def __init__(self, series, series_sessions, rounds_to_include, drop_week=False, num_scoring_drivers_in_team=2,
-                 debug_csv_parse=False):
+                 debug_csv_parse=False, cache=None, jobs=1):
         self.series = series
         self.series_sessions = series_sessions
         self.rounds_to_include = rounds_to_include
         self.drop_week = drop_week
         self.num_scoring_drivers_in_team = num_scoring_drivers_in_team
         self.debug_csv_parse = debug_csv_parse
+        self.cache = cache
+        self.jobs = jobs
 
-        print("creating championship points tables for:", series)
+        logger.info("creating championship points tables for: %s", series)
 
         self.series_drivers_table = Utils.read_drivers_table(series)
         self.series_scoring_table = Utils.read_scoring_table(series)
@@ -30,78 +65,266 @@ class Championship:
             self.series_drivers_table), "rounds_to_include must be between 1 and {}".format(
             len(self.series_drivers_table))
 
-        self.race_reports = self._read_race_reports()
+        self.race_reports = self._read_race_reports(self._get_included_tracks())
         self.series_quali_sessions = list(self.race_reports.values())[0].quali_sessions
         self.series_race_sessions = list(self.race_reports.values())[0].race_sessions
         self.num_total_races = len(self.series_tracks_table) * len(self.series_race_sessions)
 
-        drivers_points_table_unsorted = self._construct_drivers_points()
-        self.drivers_totals_table, self.drivers_points_table = self._construct_drivers_totals_and_sort_drivers_points(
-            drivers_points_table_unsorted)
-        self.teams_and_drivers_table = self._construct_teams_and_drivers_table(self.drivers_totals_table)
-        self.teams_totals_table = self._construct_teams_totals(self.drivers_totals_table)
-        self.summary_table = self._construct_summary()
-        self.drivers_participation_table = self._construct_drivers_participation(self.drivers_points_table)
-
-    def _read_race_reports(self):
-        race_reports = {}
-
-        for i, race_and_race_row in enumerate(self.series_tracks_table.iterrows()):
-            if i == self.rounds_to_include:
-                break
-
-            race, race_row = race_and_race_row
+    def _get_included_tracks(self):
+        return self.series_tracks_table.index[0:self.rounds_to_include]
+
+    # Forget the computed tables that depend on the changed tables, directly or through other tables, they are
+    # recomputed when next used
+    def _invalidate_dependent_tables(self, changed_tables):
+        outdated_tables = set(changed_tables)
+        for table, dependencies in self.table_dependencies.items():
+            if table not in changed_tables and outdated_tables.intersection(dependencies):
+                outdated_tables.add(table)
+                self.__dict__.pop(table, None)
+
+    @functools.cached_property
+    def _all_drivers_points_table(self):
+        return self._construct_drivers_points(self._get_included_tracks())
+
+    @functools.cached_property
+    def _all_drivers_totals_table(self):
+        return self._construct_drivers_totals(self._all_drivers_points_table)
+
+    @functools.cached_property
+    def _all_drivers_countback_matrix(self):
+        return self._get_countback_matrix(self._all_drivers_points_table)
+
+    @functools.cached_property
+    def _all_drivers_participation_table(self):
+        return self._all_drivers_points_table.get_weekend_participation()
+
+    @functools.cached_property
+    def _teams_weekend_totals_tables(self):
+        return self._construct_teams_weekend_totals(self._get_included_tracks())
+
+    @property
+    def _teams_weekend_totals_table(self):
+        return self._teams_weekend_totals_tables[0]
+
+    @property
+    def _teams_weekend_totals_with_drop_week_table(self):
+        return self._teams_weekend_totals_tables[1]
+
+    @functools.cached_property
+    def summary_table(self):
+        return self._construct_summary(self._get_included_tracks())
+
+    # Rows of the drivers that have participated at anything in the all drivers tables, in standings order
+    @functools.cached_property
+    @Profiling.timed("construct standings order")
+    def _drivers_standings_order(self):
+        participated = np.nonzero(self._all_drivers_points_table.participated.any(axis=1))[0]
+        totals_column = "total_with_drop_week" if self.drop_week else "total"
+        standings_order = Utils.get_standings_order(self._all_drivers_totals_table[totals_column].values[participated],
+                                                    self._all_drivers_countback_matrix[participated],
+                                                    reverse_ties=True)
+        return participated[standings_order]
+
+    @functools.cached_property
+    @Profiling.timed("construct drivers totals table")
+    def drivers_totals_table(self):
+        drivers_totals_table = self._all_drivers_totals_table.iloc[self._drivers_standings_order].copy()
+        drivers_totals_table["countback_array"] = pd.Series(
+            list(self._all_drivers_countback_matrix[self._drivers_standings_order]), index=drivers_totals_table.index,
+            dtype=object)
+        logger.debug("computed drivers totals table")
+        return drivers_totals_table
+
+    @functools.cached_property
+    def drivers_points_table(self):
+        return self._all_drivers_points_table.take(self._drivers_standings_order)
+
+    @functools.cached_property
+    def teams_and_drivers_table(self):
+        return self._construct_teams_and_drivers_table(self.drivers_totals_table)
+
+    @functools.cached_property
+    def teams_totals_table(self):
+        return self._construct_teams_totals(self.drivers_totals_table)
+
+    @functools.cached_property
+    def drivers_participation_table(self):
+        return self._construct_drivers_participation(self.drivers_points_table.index)
+
+    # Add the next round in the tracks table to the championship, only that round's results are read and added to the
+    # tables computed so far, the tables computed from them are recomputed when next used
+    @Profiling.timed("add round")
+    def add_round(self):
+        assert self.rounds_to_include < len(self.series_tracks_table), "all {} rounds are already included".format(
+            len(self.series_tracks_table))
+        track = self.series_tracks_table.index[self.rounds_to_include]
+        logger.info("adding round to championship: %s", track)
+
+        race_reports = self._read_race_reports([track])
+        assert track in race_reports, "could not read race report for {}".format(track)
+        self.race_reports[track] = race_reports[track]
+        self.rounds_to_include += 1
+
+        computed_tables = set(self.table_dependencies).intersection(self.__dict__)
+        if "_all_drivers_points_table" in computed_tables:
+            self._add_round_to_drivers_tables(track, computed_tables)
+        if "summary_table" in computed_tables:
+            self.summary_table = pd.concat([self.summary_table, self._construct_summary([track])])
+        self._invalidate_dependent_tables(["_all_drivers_points_table", "_all_drivers_totals_table",
+                                           "_all_drivers_countback_matrix", "_all_drivers_participation_table",
+                                           "_teams_weekend_totals_tables", "summary_table"])
+
+    # Add a round's results to the computed all drivers and teams weekend tables
+    def _add_round_to_drivers_tables(self, track, computed_tables):
+        round_points_table = self._construct_drivers_points([track])
+        self._all_drivers_points_table = self._all_drivers_points_table.join(round_points_table)
+        # the teams weekend totals are computed from the drivers totals, so both are computed when the teams' are
+        if "_all_drivers_totals_table" in computed_tables:
+            previous_drop_weeks = self._all_drivers_totals_table["drop_week"]
+            self._all_drivers_totals_table = self._add_round_to_drivers_totals(
+                self._all_drivers_totals_table, round_points_table.get_weekend_totals()[track])
+        if "_all_drivers_countback_matrix" in computed_tables:
+            self._all_drivers_countback_matrix = self._all_drivers_countback_matrix + self._get_countback_matrix(
+                round_points_table)
+        if "_all_drivers_participation_table" in computed_tables:
+            self._all_drivers_participation_table[track] = round_points_table.get_weekend_participation()[track]
+
+        if "_teams_weekend_totals_tables" in computed_tables:
+            # team scores with drop weeks change for the new round and for weekends that stopped being some driver's
+            # drop week
+            changed_drop_weeks = previous_drop_weeks[
+                previous_drop_weeks != self._all_drivers_totals_table["drop_week"]]
+            changed_weekends = [weekend for weekend in self._teams_weekend_totals_table.columns if
+                                weekend in changed_drop_weeks.values]
+            teams_round_totals, _ = self._construct_teams_weekend_totals([track])
+            _, teams_changed_weekends_totals_with_drop_week = self._construct_teams_weekend_totals(
+                changed_weekends + [track])
+            self._teams_weekend_totals_tables = (
+                self._update_teams_weekend_totals(self._teams_weekend_totals_table, teams_round_totals),
+                self._update_teams_weekend_totals(self._teams_weekend_totals_with_drop_week_table,
+                                                  teams_changed_weekends_totals_with_drop_week))
+
+    # Hashes of the series tables and the csvs in every included round's directory, a saved state is only reused while
+    # these are unchanged
+    def _get_input_hashes(self):
+        return Utils.get_series_input_hashes(self.series, self.series_tracks_table.index[0:self.rounds_to_include])
+
+    # Save the championship so a later run can add new rounds to it with load_state instead of recomputing the season
+    @Profiling.timed("save state")
+    def save_state(self, state_file):
+        for table in self.state_tables:
+            getattr(self, table)
+        state = {"state_version": self.state_version, "input_hashes": self._get_input_hashes(), "championship": self}
+        with Utils.open_atomic(state_file, "wb") as fp:
+            pickle.dump(state, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        logger.info("saved championship state: %s", state_file)
+
+    # Load a championship saved by save_state and add the rounds up to rounds_to_include to it
+    # Returns None if there is no saved state, or it was saved with different settings, more rounds or other inputs
+    @staticmethod
+    @Profiling.timed("load state")
+    def load_state(state_file, series, series_sessions, rounds_to_include, drop_week=False,
+                   num_scoring_drivers_in_team=2, debug_csv_parse=False, cache=None, jobs=1):
+        if not os.path.isfile(state_file):
+            return None
+        try:
+            with open(state_file, "rb") as fp:
+                state = pickle.load(fp)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            logger.warning("ignoring unreadable championship state: %s", state_file)
+            return None
+
+        championship = state["championship"]
+        settings = (series, list(series_sessions), drop_week, num_scoring_drivers_in_team)
+        saved_settings = (championship.series, list(championship.series_sessions), championship.drop_week,
+                          championship.num_scoring_drivers_in_team)
+        if state["state_version"] != Championship.state_version or settings != saved_settings or \
+                championship.rounds_to_include > rounds_to_include or \
+                state["input_hashes"] != championship._get_input_hashes():
+            logger.info("championship state is out of date: %s", state_file)
+            return None
+        logger.info("loaded championship state with %d stored tables: %s",
+                    len(set(Championship.state_tables).intersection(championship.__dict__)), state_file)
+
+        championship.debug_csv_parse = debug_csv_parse
+        championship.cache = cache
+        championship.jobs = jobs
+        while championship.rounds_to_include < rounds_to_include:
+            championship.add_round()
+        return championship
+
+    # Read rounds in tracks table order, optionally spread over a pool of jobs processes
+    @Profiling.timed("read race reports")
+    def _read_race_reports(self, tracks):
+        races_to_read = []
+        for race in tracks:
             race_path = os.path.join(self.series, race)
             if os.path.isdir(race_path):
-                try:
-                    race_reports[race] = RaceReport(self.series_sessions, self.series, race,
-                                                    drivers_table=self.series_drivers_table,
-                                                    scoring_table=self.series_scoring_table,
-                                                    csv_manual_adjustment=race_row["csv_manual_adjustment"],
-                                                    debug_csv_parse=self.debug_csv_parse)
-                    print("read race report for", race_path)
-                except FileNotFoundError:
-                    print("no csv found for", race)
+                races_to_read.append((race, self.series_tracks_table.loc[race, "csv_manual_adjustment"]))
             else:
-                print("no directory found for", race)
-
-        return race_reports
-
-    def _construct_drivers_points(self):
-        drivers_points_table = pd.DataFrame(index=self.series_drivers_table.index, columns=pd.MultiIndex.from_product(
-            [self.series_tracks_table.index, self.series_race_sessions], names=["track", "session"]))
-        # truncate table to only calculate up to rounds needed
-        drivers_points_table = drivers_points_table.iloc[:, 0:(self.rounds_to_include * len(self.series_race_sessions))]
-
-        for driver in drivers_points_table.index:
-            for track, session in drivers_points_table.columns:
-
-                result_info = DriverRaceResultInfo()
-
-                race_table = self.race_reports[track].tables[session]
-                driver_race_result = race_table[race_table["Driver"] == driver]
-
-                if len(driver_race_result == 1):
-                    pos = driver_race_result.index[0]
-                    points = driver_race_result["Points"].item()
-                    qualify_pos = driver_race_result["Grid"].item()
-                    qualify_points = driver_race_result[
-                        "Qualify Points"].item() if "Qualify Points" in driver_race_result.columns else 0
-                    dnf = driver_race_result["DNF"].item()
-
-                    result_info = DriverRaceResultInfo(pos, points, qualify_pos, qualify_points, dnf)
+                logger.warning("no directory found for %s", race)
+
+        race_reports_args = [(self.series_sessions, self.series, race, csv_manual_adjustment, self.debug_csv_parse,
+                              self.cache) for race, csv_manual_adjustment in races_to_read]
+
+        if self.jobs > 1 and len(races_to_read) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.jobs, len(races_to_read))) as executor:
+                race_reports_futures = [
+                    executor.submit(_read_race_report_in_worker, Profiling.is_enabled(), "race report {}".format(race),
+                                    *args, drivers_table=self.series_drivers_table,
+                                    scoring_table=self.series_scoring_table)
+                    for (race, _), args in zip(races_to_read, race_reports_args)]
+                race_reports_results = [functools.partial(_get_worker_race_report, future) for future in
+                                        race_reports_futures]
+        else:
+            race_reports_results = [
+                functools.partial(_read_race_report_in_span, "race report {}".format(race), *args,
+                                  drivers_table=self.series_drivers_table, scoring_table=self.series_scoring_table)
+                for (race, _), args in zip(races_to_read, race_reports_args)]
 
-                drivers_points_table.loc[driver, (track, session)] = result_info
+        race_reports = {}
+        for (race, _), get_race_report in zip(races_to_read, race_reports_results):
+            race_path = os.path.join(self.series, race)
+            try:
+                race_report = get_race_report()
+                race_report.drivers_table = self.series_drivers_table
+                race_report.scoring_table = self.series_scoring_table
+                race_reports[race] = race_report
+                logger.info("read race report for %s", race_path)
+            except FileNotFoundError:
+                logger.warning("no csv found for %s", race)
 
-        # drop drivers without no results at all
-        no_shows = []
-        for driver in drivers_points_table.index:
-            if not drivers_points_table.loc[driver].apply(lambda r_info: r_info.participated).any():
-                no_shows.append(driver)
-        drivers_points_table = drivers_points_table.drop(index=no_shows)
+        return race_reports
 
-        print("computed drivers points table")
-        return drivers_points_table
+    # Every series driver's result info in every race session of the tracks, as a columnar DriversPointsTable of
+    # drivers x (track, session), built from one concat of all session tables pivoted to dense matrices
+    @Profiling.timed("construct drivers points")
+    def _construct_drivers_points(self, tracks):
+        columns = pd.MultiIndex.from_product([tracks, self.series_race_sessions], names=["track", "session"])
+
+        sessions_results = []
+        for track, session in columns:
+            race_table = self.race_reports[track].tables[session]
+            session_results = pd.DataFrame({"driver": race_table["Driver"].values,
+                                            "track": track,
+                                            "session": session,
+                                            "pos": race_table.index.values,
+                                            "points": race_table["Points"].values,
+                                            "quali_pos": race_table["Grid"].values,
+                                            "quali_points": race_table["Qualify Points"].values
+                                            if "Qualify Points" in race_table.columns else 0,
+                                            "dnf": race_table["DNF"].values})
+            sessions_results.append(session_results)
+        all_results = pd.concat(sessions_results, ignore_index=True)
+        all_results_pivoted = all_results.pivot(index="driver", columns=["track", "session"])
+
+        matrices = {}
+        for name, no_result_value in DriversPointsTable.no_result_values.items():
+            matrix = all_results_pivoted[name].reindex(index=self.series_drivers_table.index, columns=columns)
+            matrices[name] = matrix.fillna(no_result_value).values.astype(DriversPointsTable.dtypes[name])
+
+        logger.debug("computed drivers points table")
+        return DriversPointsTable(self.series_drivers_table.index, columns, **matrices)
 
     def _construct_teams_and_drivers_table(self, drivers_points_table):
         # note that this will contains only drivers that have participated at anything
@@ -117,112 +340,104 @@ class Championship:
             teams_and_drivers_table = teams_and_drivers_table.reindex(index + [Utils.NO_TEAM])
         return teams_and_drivers_table
 
-    def _get_countback_array(self, driver_all_results):
-        countback_arr = np.zeros(len(self.series_drivers_table))
-        for pos in range(1, len(self.series_drivers_table) + 1):
-            num_finished_in_pos = driver_all_results.apply(lambda result_info: result_info.pos == pos).sum()
-            countback_arr[pos - 1] = num_finished_in_pos
-        return countback_arr
-
-    def _index_sort_countback_arrays(self, countback_arrays):
-        countback_arrays_stacked = np.stack(countback_arrays)
-        index_col = np.array(range(countback_arrays_stacked.shape[0])).reshape(-1, 1)
-        countback_arrays_sorted_with_index = np.hstack((index_col, countback_arrays_stacked))
-
-        for col_to_sort_by in range(countback_arrays_sorted_with_index.shape[0] - 1, 0, -1):
-            countback_arrays_sorted_with_index = countback_arrays_sorted_with_index[
-                countback_arrays_sorted_with_index[:, col_to_sort_by].argsort(kind='mergesort')]
-
-        return pd.Series(np.flip(countback_arrays_sorted_with_index[:, 0]))
-
-    def _get_weekend_totals(self, weekend_results):
-        weekend_total_points = weekend_results.applymap(lambda result_info: result_info.total_points)
-        return weekend_total_points.sum(axis=1)
-
-    def _get_drop_week_name(self, driver_row):
-        return driver_row.index[np.argmin(driver_row)]
-
-    def _subtract_drop_week_score_from_driver_total(self, driver_row):
-        return driver_row["total"] - driver_row.loc[driver_row["drop_week"]]
-
-    def _construct_drivers_totals_and_sort_drivers_points(self, drivers_points_table):
-        drivers_totals_table = drivers_points_table.groupby(level=0, axis=1, sort=False).agg(self._get_weekend_totals)
-
-        drivers_totals_table["drop_week"] = drivers_totals_table.agg(self._get_drop_week_name, axis=1)
-        drivers_totals_table["total"] = drivers_totals_table.drop(columns="drop_week").sum(axis=1)
-        drivers_totals_table["total_with_drop_week"] = drivers_totals_table.apply(
-            self._subtract_drop_week_score_from_driver_total, axis=1)
-
-        drivers_totals_table["countback_array"] = drivers_points_table.apply(self._get_countback_array, axis=1)
-        drivers_totals_table = drivers_totals_table.sort_values("countback_array", key=lambda x: np.argsort(
-            self._index_sort_countback_arrays(drivers_totals_table["countback_array"])))
+    # Number of finishes in each position from 1 to the number of series drivers, for every driver in the table
+    @Profiling.timed("countback")
+    def _get_countback_matrix(self, drivers_points_table):
+        num_positions = len(self.series_drivers_table)
+        positions = drivers_points_table.pos
+        finished = (positions >= 1) & (positions <= num_positions)
+        drivers_rows = np.nonzero(finished)[0]
+        countback_cells = drivers_rows * num_positions + positions[finished].astype(np.int64) - 1
+        countback_matrix = np.bincount(countback_cells, minlength=len(positions) * num_positions)
+        return countback_matrix.reshape(len(positions), num_positions)
+
+    # Weekend totals, lowest scoring weekend as the drop week, and season totals with and without it for every driver
+    @Profiling.timed("construct drivers totals")
+    def _construct_drivers_totals(self, drivers_points_table):
+        drivers_totals_table = drivers_points_table.get_weekend_totals()
+        weekend_totals = drivers_totals_table.values
+
+        drop_weeks = np.argmin(weekend_totals, axis=1)
+        drivers_totals_table["drop_week"] = drivers_totals_table.columns[drop_weeks].values
+        drivers_totals_table["total"] = weekend_totals.sum(axis=1)
+        drivers_totals_table["total_with_drop_week"] = drivers_totals_table["total"] - weekend_totals[
+            np.arange(len(weekend_totals)), drop_weeks]
+        return drivers_totals_table
+
+    # Add a round's weekend totals to the drivers totals, the new weekend only becomes the drop week if it's strictly
+    # lower since argmin keeps the earliest of tied weekends
+    def _add_round_to_drivers_totals(self, drivers_totals_table, round_weekend_totals):
+        track = round_weekend_totals.name
+        drop_week_scores = drivers_totals_table["total"] - drivers_totals_table["total_with_drop_week"]
+
+        drivers_totals_table = drivers_totals_table.copy()
+        drivers_totals_table.insert(drivers_totals_table.columns.get_loc("drop_week"), track, round_weekend_totals)
+        drivers_totals_table["drop_week"] = drivers_totals_table["drop_week"].where(
+            round_weekend_totals >= drop_week_scores, track)
+        drivers_totals_table["total"] = drivers_totals_table["total"] + round_weekend_totals
+        drivers_totals_table["total_with_drop_week"] = drivers_totals_table["total"] - np.minimum(drop_week_scores,
+                                                                                                  round_weekend_totals)
+        return drivers_totals_table
+
+    # Sum of the top num_scoring_drivers_in_team weekend totals of each team's drivers
+    def _get_teams_scores(self, drivers_weekend_totals, drivers_teams):
+        drivers_weekend_ranks = drivers_weekend_totals.groupby(drivers_teams).rank(method="first", ascending=False)
+        drivers_weekend_scoring_totals = drivers_weekend_totals.where(
+            drivers_weekend_ranks <= self.num_scoring_drivers_in_team, 0)
+        return drivers_weekend_scoring_totals.groupby(drivers_teams).sum()
+
+    # Team scores for each of the weekends, without and with the drivers' drop week scores deleted
+    @Profiling.timed("construct teams weekend totals")
+    def _construct_teams_weekend_totals(self, weekends):
+        participated = self._all_drivers_points_table.participated.any(axis=1)
+        drivers_totals_table = self._all_drivers_totals_table[participated]
+        drivers_teams = self.series_drivers_table.loc[drivers_totals_table.index, "team"]
 
-        if self.drop_week:
-            drivers_totals_table = drivers_totals_table.sort_values("total_with_drop_week", ascending=False,
-                                                                    kind="mergesort")  # mergesort is required to stable sort
-        else:
-            drivers_totals_table = drivers_totals_table.sort_values("total", ascending=False, kind="mergesort")
-
-        drivers_points_table_sorted = drivers_points_table.reindex(drivers_totals_table.index)
-        print("computed drivers totals table")
-        return drivers_totals_table, drivers_points_table_sorted
-
-    def _add_teams_driver_scores(self, drivers_results):
-        return drivers_results.sort_values(ascending=False)[:self.num_scoring_drivers_in_team].sum()
-
-    def _delete_drop_week_score_from_drivers_weekend_totals(self, driver_weekend_totals_row):
-        driver_weekend_totals_row.loc[driver_weekend_totals_row["drop_week"]] = 0
-        return driver_weekend_totals_row
-
-    def _add_countback_arrays(self, countback_arrays):
-        countback_arrays_stacked = np.stack(countback_arrays)
-        # must cast to list cause of Must produce aggregated value issue stackoverflow.com/questions/39840546/must-produce-aggregated-value-i-swear-that-i-am
-        return list(np.sum(countback_arrays_stacked, axis=0))
-
-    def _construct_teams_totals(self, drivers_totals_table):
-        drivers_teams_table = self.series_drivers_table[["team"]]
-        drivers_totals_table_with_teams = drivers_totals_table.merge(drivers_teams_table, left_index=True,
-                                                                     right_index=True)
         # drivers without teams don't participate in team scoring
-        drivers_totals_table_with_teams = drivers_totals_table_with_teams[
-            -(drivers_totals_table_with_teams["team"] == Utils.NO_TEAM)]
-        drivers_weekend_totals_with_drop_week_and_teams = drivers_totals_table_with_teams.drop(
-            columns=["total", "total_with_drop_week", "countback_array"])
-
-        teams_totals_by_weekend = drivers_weekend_totals_with_drop_week_and_teams.drop(columns="drop_week").groupby(
-            "team").agg(self._add_teams_driver_scores)
-        total_column = teams_totals_by_weekend.sum(axis=1)
-
-        drivers_weekend_totals_with_drop_week_score_deleted_and_teams = drivers_weekend_totals_with_drop_week_and_teams.apply(
-            self._delete_drop_week_score_from_drivers_weekend_totals, axis=1)
-        teams_totals_with_drop_week_by_weekend = drivers_weekend_totals_with_drop_week_score_deleted_and_teams.drop(
-            columns="drop_week").groupby("team").agg(self._add_teams_driver_scores)
-        total_with_drop_week_column = teams_totals_with_drop_week_by_weekend.sum(axis=1)
-
-        countback_array_column = drivers_totals_table_with_teams.groupby("team")["countback_array"].agg(
-            self._add_countback_arrays).apply(lambda lst: np.array(lst))
-
-        teams_totals_table = pd.concat(
-            [total_column, total_with_drop_week_column, countback_array_column], axis=1)
-        teams_totals_table.columns = ["total", "total_with_drop_week", "countback_array"]
-
-        drivers_totals_table = drivers_totals_table.sort_values("countback_array", key=lambda x: np.argsort(
-            self._index_sort_countback_arrays(drivers_totals_table["countback_array"])))
-
-        if self.drop_week:
-            teams_totals_table = teams_totals_table.sort_values("total_with_drop_week", ascending=False,
-                                                                kind="mergesort")  # mergesort is required to stable sort
-        else:
-            teams_totals_table = teams_totals_table.sort_values("total", ascending=False, kind="mergesort")
-        print("computed teams totals table")
+        has_team = (drivers_teams != Utils.NO_TEAM).values
+        drivers_totals_table = drivers_totals_table[has_team]
+        drivers_teams = drivers_teams[has_team]
+
+        drivers_weekend_totals = drivers_totals_table[list(weekends)]
+        is_drop_week = drivers_totals_table["drop_week"].values.reshape(-1, 1) == np.array(list(weekends)).reshape(1, -1)
+        drivers_weekend_totals_with_drop_week_deleted = drivers_weekend_totals.where(~is_drop_week, 0)
+
+        return self._get_teams_scores(drivers_weekend_totals, drivers_teams), self._get_teams_scores(
+            drivers_weekend_totals_with_drop_week_deleted, drivers_teams)
+
+    # Overwrite or append weekend columns of a teams weekend totals table, teams new to it score 0 in earlier weekends
+    def _update_teams_weekend_totals(self, teams_weekend_totals_table, teams_weekends_totals):
+        teams = teams_weekend_totals_table.index.union(teams_weekends_totals.index).rename("team")
+        teams_weekend_totals_table = teams_weekend_totals_table.reindex(teams, fill_value=0)
+        for weekend in teams_weekends_totals.columns:
+            teams_weekend_totals_table[weekend] = teams_weekends_totals[weekend].reindex(teams, fill_value=0)
+        return teams_weekend_totals_table
+
+    @Profiling.timed("construct teams totals")
+    def _construct_teams_totals(self, drivers_totals_table):
+        teams_totals_table = pd.concat([self._teams_weekend_totals_table.sum(axis=1),
+                                        self._teams_weekend_totals_with_drop_week_table.sum(axis=1)], axis=1)
+        teams_totals_table.columns = ["total", "total_with_drop_week"]
+
+        # a team's countback is the sum of its drivers' countbacks
+        drivers_teams = self.series_drivers_table.loc[drivers_totals_table.index, "team"]
+        teams_countback_table = pd.DataFrame(list(drivers_totals_table["countback_array"]),
+                                             index=drivers_teams).groupby(level=0).sum()
+        teams_countback_matrix = teams_countback_table.reindex(teams_totals_table.index).values
+        teams_totals_table["countback_array"] = pd.Series(list(teams_countback_matrix), index=teams_totals_table.index,
+                                                          dtype=object)
+
+        totals_column = "total_with_drop_week" if self.drop_week else "total"
+        teams_totals_table = teams_totals_table.iloc[
+            Utils.get_standings_order(teams_totals_table[totals_column].values, teams_countback_matrix)]
+        logger.debug("computed teams totals table")
         return teams_totals_table
 
-    def _construct_summary(self):
+    @Profiling.timed("construct summary")
+    def _construct_summary(self, tracks):
         summary_table = pd.DataFrame(
-            index=pd.MultiIndex.from_product([self.series_tracks_table.index, self.series_race_sessions],
-                                             names=["track", "session"]), columns=["link", "pole", "fastest", "winner"])
-        # truncate results to only calculate up to rounds needed
-        summary_table = summary_table.iloc[0:(self.rounds_to_include * len(self.series_race_sessions))]
+            index=pd.MultiIndex.from_product([tracks, self.series_race_sessions], names=["track", "session"]),
+            columns=["link", "pole", "fastest", "winner"])
 
         for track, session in summary_table.index:
             race_report = self.race_reports[track]
@@ -242,13 +457,9 @@ class Championship:
         drivers_teams_table = self.series_drivers_table[["team"]]
         summary_table = summary_table.merge(drivers_teams_table, how='left', left_on="winner", right_index=True)
 
-        print("computed results summary table")
+        logger.debug("computed results summary table")
         return summary_table
 
-    def _get_weekend_participation(self, weekend_results):
-        weekend_total_points = weekend_results.applymap(lambda result_info: result_info.participated)
-        return weekend_total_points.all(axis=1)
-
     def _get_participation_string(self, driver_participations):
         participation_sequences = []
         sequence = None
@@ -268,16 +479,50 @@ class Championship:
             ["{}-{}".format(s[0], s[1]) if s[1] - s[0] > 0 else str(s[0]) for s in participation_sequences])
         return participation_string
 
-    def _construct_drivers_participation(self, drivers_points_table):
-        drivers_participation_table = drivers_points_table.groupby(level=0, axis=1, sort=False).agg(
-            self._get_weekend_participation)
+    @Profiling.timed("construct drivers participation")
+    def _construct_drivers_participation(self, drivers):
+        drivers_participation_table = self._all_drivers_participation_table.loc[drivers]
         drivers_participation_table["participation_string"] = drivers_participation_table.apply(
             self._get_participation_string, axis=1)
 
-        print("computed drivers participation table")
+        logger.debug("computed drivers participation table")
         return drivers_participation_table
 
 
+# Read a race report without the series tables shared by every report, so that reports read in a process pool are
+# pickled back to the parent with only their own tables, the parent reattaches its copies of the series tables
+def _read_race_report(session_names, series_directory, race_directory, csv_manual_adjustment, debug_csv_parse, cache,
+                      drivers_table, scoring_table):
+    race_report = RaceReport(session_names, series_directory, race_directory, drivers_table=drivers_table,
+                             scoring_table=scoring_table, csv_manual_adjustment=csv_manual_adjustment,
+                             debug_csv_parse=debug_csv_parse, cache=cache)
+    race_report.drivers_table = None
+    race_report.scoring_table = None
+    return race_report
+
+
+def _read_race_report_in_span(span_name, *args, **kwargs):
+    with Profiling.span(span_name):
+        return _read_race_report(*args, **kwargs)
+
+
+# Read a round in a pool worker, recording its spans there when the main process is profiling, a worker reads several
+# rounds and inherits the main process' spans when forked so they're cleared first
+def _read_race_report_in_worker(profile, span_name, *args, **kwargs):
+    Profiling.reset()
+    if profile:
+        Profiling.enable()
+    race_report = _read_race_report_in_span(span_name, *args, **kwargs)
+    return race_report, Profiling.get_root_spans()
+
+
+# A round read by _read_race_report_in_worker, its spans are timed in the worker as the result is only waited on here
+def _get_worker_race_report(race_report_future):
+    race_report, spans = race_report_future.result()
+    Profiling.add_spans(spans)
+    return race_report
+
+
 # compressed race result info obj for a driver and session
 class DriverRaceResultInfo:
 
@@ -301,3 +546,69 @@ class DriverRaceResultInfo:
     def __repr__(self):
         return "DriverRaceResultInfo({},{},{},{},{})".format(self.pos, self.points, self.quali_pos,
                                                              self.quali_points, self.dnf)
+
+
+# Columnar store of result info for drivers x (track, session) race sessions, one compact matrix per
+# DriverRaceResultInfo attribute so totals, participation and rendering read whole columns at once
+class DriversPointsTable:
+    dtypes = {"pos": np.int16, "points": np.int16, "quali_pos": np.int16, "quali_points": np.int16, "dnf": np.bool_}
+    no_result_values = {"pos": -1, "points": 0, "quali_pos": -1, "quali_points": 0, "dnf": False}
+
+    def __init__(self, index, columns, pos, points, quali_pos, quali_points, dnf):
+        self.index = index
+        self.columns = columns
+        self.pos = pos
+        self.points = points
+        self.quali_pos = quali_pos
+        self.quali_points = quali_points
+        self.dnf = dnf
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def participated(self):
+        return (self.pos != -1) | (self.quali_pos != -1)
+
+    @property
+    def total_points(self):
+        return self.points.astype(np.int64) + self.quali_points
+
+    # New table with the other table's columns added after this table's, both tables must have the same drivers
+    def join(self, other):
+        return DriversPointsTable(self.index, self.columns.append(other.columns),
+                                  *[np.hstack([getattr(self, name), getattr(other, name)]) for name in self.dtypes])
+
+    # New table with only the drivers selected by a boolean mask or array of row positions
+    def take(self, rows):
+        return DriversPointsTable(self.index[rows], self.columns, self.pos[rows], self.points[rows],
+                                  self.quali_pos[rows], self.quali_points[rows], self.dnf[rows])
+
+    def reindex(self, index):
+        return self.take(self.index.get_indexer(index))
+
+    # Dataframe of one attribute's matrix, e.x. to_frame("points")
+    def to_frame(self, name):
+        return pd.DataFrame(getattr(self, name), index=self.index, columns=self.columns)
+
+    def get_result_info(self, driver, column):
+        row = self.index.get_loc(driver)
+        col = self.columns.get_loc(column)
+        return DriverRaceResultInfo(self.pos[row, col], self.points[row, col], self.quali_pos[row, col],
+                                    self.quali_points[row, col], self.dnf[row, col])
+
+    # Start column and name of each track's group of sessions, in order
+    def _get_weekends(self):
+        tracks = self.columns.get_level_values(0)
+        weekend_starts = [i for i in range(len(tracks)) if i == 0 or tracks[i] != tracks[i - 1]]
+        return weekend_starts, tracks[weekend_starts]
+
+    def get_weekend_totals(self):
+        weekend_starts, weekend_tracks = self._get_weekends()
+        weekend_totals = np.add.reduceat(self.total_points, weekend_starts, axis=1)
+        return pd.DataFrame(weekend_totals, index=self.index, columns=pd.Index(weekend_tracks, name="track"))
+
+    def get_weekend_participation(self):
+        weekend_starts, weekend_tracks = self._get_weekends()
+        weekend_participation = np.logical_and.reduceat(self.participated, weekend_starts, axis=1)
+        return pd.DataFrame(weekend_participation, index=self.index, columns=pd.Index(weekend_tracks, name="track"))
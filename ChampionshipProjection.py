@@ -0,0 +1,229 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import Profiling
+from Championship import Championship
+from RaceReportCache import RaceReportCache
+
+logger = logging.getLogger(__name__)
+
+
+class ChampionshipProjection:
+
+    # Title and final position probabilities of the championship's drivers and teams from num_seasons simulations of
+    # the rounds remaining after its included rounds, run in batches of batch_size seasons that can be spread over a pool
+    # of jobs processes, every batch has its own random stream spawned from seed so the results don't depend on jobs
+    @Profiling.timed("championship projection")
+    def __init__(self, championship, num_seasons=100000, batch_size=10000, seed=None, jobs=1):
+        assert num_seasons >= 1, "num_seasons must be at least 1"
+        assert batch_size >= 1, "batch_size must be at least 1"
+        self.championship = championship
+        self.num_seasons = num_seasons
+
+        simulator = SeasonSimulator(championship)
+        batch_sizes = [min(batch_size, num_seasons - start) for start in range(0, num_seasons, batch_size)]
+        seed_sequence = np.random.SeedSequence(seed)
+        # the entropy of a random seed is kept so the projection can be reproduced
+        self.seed = seed_sequence.entropy
+        batch_seed_sequences = seed_sequence.spawn(len(batch_sizes))
+        logger.info("simulating %d seasons of %d remaining rounds in %d batches with seed %d", num_seasons,
+                    simulator.num_remaining_rounds, len(batch_sizes), self.seed)
+
+        if jobs > 1 and len(batch_sizes) > 1:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(batch_sizes))) as executor:
+                batch_results = list(executor.map(simulator.simulate, batch_seed_sequences, batch_sizes))
+        else:
+            batch_results = [simulator.simulate(batch_seed_sequence, num_batch_seasons) for
+                             batch_seed_sequence, num_batch_seasons in zip(batch_seed_sequences, batch_sizes)]
+        drivers_position_counts, drivers_points_sums, teams_position_counts, teams_points_sums = [
+            sum(batch_result[i] for batch_result in batch_results) for i in range(4)]
+
+        totals_column = "total_with_drop_week" if championship.drop_week else "total"
+        self.drivers_position_probabilities = self._get_position_probabilities(drivers_position_counts,
+                                                                               simulator.drivers)
+        self.drivers_projection_table = self._construct_projection_table(
+            self.drivers_position_probabilities, championship.drivers_totals_table[totals_column], drivers_points_sums)
+        self.teams_position_probabilities = self._get_position_probabilities(teams_position_counts, simulator.teams)
+        self.teams_projection_table = self._construct_projection_table(
+            self.teams_position_probabilities, championship.teams_totals_table[totals_column], teams_points_sums)
+
+    def _get_position_probabilities(self, position_counts, index):
+        return pd.DataFrame(position_counts / self.num_seasons, index=index,
+                            columns=pd.RangeIndex(1, position_counts.shape[1] + 1, name="pos"))
+
+    def _construct_projection_table(self, position_probabilities, points, points_sums):
+        projection_table = pd.DataFrame({"points": points.values,
+                                         "expected_points": points_sums / self.num_seasons,
+                                         "expected_pos": position_probabilities.values @ position_probabilities.columns.values,
+                                         "title": position_probabilities[1].values}, index=position_probabilities.index)
+        return projection_table
+
+
+class SeasonSimulator:
+
+    # Everything needed to simulate the remaining rounds as arrays of the championship's participants in standings order,
+    # so it's cheap to send to pool processes
+    # Drivers enter each remaining round with the share of included rounds they entered, and their finishing and grid
+    # positions in it are drawn from the ones they had so far, then ranked among the round's entrants
+    def __init__(self, championship):
+        points_table = championship.drivers_points_table
+        self.drivers = points_table.index
+        self.num_remaining_rounds = len(championship.series_tracks_table) - championship.rounds_to_include
+        self.drop_week = championship.drop_week
+
+        race_report = next(iter(championship.race_reports.values()))
+        self.grid_from_quali = np.array([race_report.race_session_grid_determined_by[session] in
+                                         race_report.quali_sessions for session in championship.series_race_sessions])
+        weekend_starts, weekends = points_table._get_weekends()
+        sessions_grid_from_quali = np.tile(self.grid_from_quali, len(weekends))
+
+        race_mask = points_table.pos > 0
+        quali_mask = (points_table.quali_pos > 0) & sessions_grid_from_quali
+        width = max(race_mask.sum(axis=1).max(), quali_mask.sum(axis=1).max(), 1)
+        race_positions, num_race_positions = self._get_past_positions(points_table.pos, race_mask, width)
+        quali_positions, num_quali_positions = self._get_past_positions(points_table.quali_pos, quali_mask, width)
+        # drivers without finishes are drawn last, drivers without grids from qualifying qualify like they finish
+        no_race_positions = num_race_positions == 0
+        race_positions[no_race_positions, 0] = len(self.drivers)
+        num_race_positions[no_race_positions] = 1
+        no_quali_positions = num_quali_positions == 0
+        quali_positions[no_quali_positions] = race_positions[no_quali_positions]
+        num_quali_positions[no_quali_positions] = num_race_positions[no_quali_positions]
+        self.race_positions, self.num_race_positions = race_positions, num_race_positions
+        self.quali_positions, self.num_quali_positions = quali_positions, num_quali_positions
+
+        self.weekend_entry_rates = np.logical_or.reduceat(points_table.participated, weekend_starts, axis=1).mean(axis=1)
+        self.weekend_totals = points_table.get_weekend_totals().values.astype(np.int64)
+        self.wins = (points_table.pos == 1).sum(axis=1)
+
+        scoring_table = championship.series_scoring_table
+        self.points_by_position = np.zeros(len(self.drivers) + 1, dtype=np.int64)
+        self.quali_points_by_position = np.zeros(len(self.drivers) + 1, dtype=np.int64)
+        scoring_table = scoring_table[scoring_table.index <= len(self.drivers)]
+        self.points_by_position[scoring_table.index.values] = scoring_table["points"].values
+        self.quali_points_by_position[scoring_table.index.values] = scoring_table["quali_points"].values
+
+        # drivers without teams don't participate in team scoring
+        self.teams = championship.teams_totals_table.index
+        drivers_teams = championship.series_drivers_table.loc[self.drivers, "team"].values
+        self.teams_drivers = [np.flatnonzero(drivers_teams == team) for team in self.teams]
+        self.num_scoring_drivers_in_team = championship.num_scoring_drivers_in_team
+
+    # Each driver's masked positions moved to the front of their row of width columns, with how many each driver has
+    @staticmethod
+    def _get_past_positions(positions, mask, width):
+        order = np.argsort(~mask, axis=1, kind="stable")
+        past_positions = np.take_along_axis(positions.astype(np.int64), order, axis=1)[:, 0:width]
+        return past_positions, mask.sum(axis=1)
+
+    # Rank of each entrant's drawn position among the entrants, 1 for the best, along the last axis
+    def _draw_ranks(self, rng, past_positions, num_past_positions, entered):
+        draws = (rng.random(entered.shape) * num_past_positions).astype(np.int64)
+        # drawn positions are integers, the added fraction breaks ties randomly
+        scores = past_positions[np.arange(len(self.drivers)), draws] + rng.random(entered.shape)
+        scores[~entered] = np.inf
+        order = np.argsort(scores, axis=-1)
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.broadcast_to(np.arange(1, len(self.drivers) + 1), order.shape), axis=-1)
+        return ranks
+
+    # Final position counts and summed final points of drivers and teams over num_seasons simulated seasons
+    # Ties are broken by race wins then the current standings, since simulating full countback isn't worth its cost
+    def simulate(self, seed_sequence, num_seasons):
+        rng = np.random.default_rng(seed_sequence)
+        num_drivers = len(self.drivers)
+        num_races = len(self.grid_from_quali)
+
+        # seasons x rounds x (races x) drivers
+        entered = rng.random((num_seasons, self.num_remaining_rounds, num_drivers)) < self.weekend_entry_rates
+        races_entered = np.broadcast_to(entered[:, :, None, :],
+                                        (num_seasons, self.num_remaining_rounds, num_races, num_drivers))
+        race_ranks = self._draw_ranks(rng, self.race_positions, self.num_race_positions, races_entered)
+        quali_ranks = self._draw_ranks(rng, self.quali_positions, self.num_quali_positions, entered)
+        race_points = np.where(races_entered, self.points_by_position[race_ranks], 0).sum(axis=2)
+        quali_points = np.where(entered, self.quali_points_by_position[quali_ranks], 0) * self.grid_from_quali.sum()
+
+        # seasons x drivers x (included and remaining) weekends
+        weekend_totals = np.concatenate(
+            [np.broadcast_to(self.weekend_totals, (num_seasons,) + self.weekend_totals.shape),
+             (race_points + quali_points).transpose(0, 2, 1)], axis=2)
+        totals = weekend_totals.sum(axis=2)
+        if self.drop_week:
+            totals = totals - weekend_totals.min(axis=2)
+        wins = self.wins + ((race_ranks == 1) & races_entered).sum(axis=(1, 2))
+        drivers_position_counts = self._get_position_counts(np.lexsort(
+            (np.broadcast_to(np.arange(num_drivers), totals.shape), -wins, -totals), axis=-1))
+
+        teams_totals = np.zeros((num_seasons, len(self.teams)), dtype=np.int64)
+        if self.drop_week:
+            is_drop_week = weekend_totals.argmin(axis=2)[:, :, None] == np.arange(weekend_totals.shape[2])
+            weekend_totals = np.where(is_drop_week, 0, weekend_totals)
+        for i, team_drivers in enumerate(self.teams_drivers):
+            teams_totals[:, i] = np.sort(weekend_totals[:, team_drivers], axis=1)[
+                                 :, -self.num_scoring_drivers_in_team:].sum(axis=(1, 2))
+        teams_position_counts = self._get_position_counts(np.lexsort(
+            (np.broadcast_to(np.arange(len(self.teams)), teams_totals.shape), -teams_totals), axis=-1))
+
+        return drivers_position_counts, totals.sum(axis=0), teams_position_counts, teams_totals.sum(axis=0)
+
+    # Times each row finished in each position, from every season's standings order of rows
+    @staticmethod
+    def _get_position_counts(standings_orders):
+        num_rows = standings_orders.shape[1]
+        position_cells = standings_orders * num_rows + np.arange(num_rows)
+        return np.bincount(position_cells.ravel(), minlength=num_rows * num_rows).reshape(num_rows, num_rows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Project a series' final drivers' and teams' standings by simulating its remaining rounds many times from the results so far.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required_args = parser.add_argument_group(title="Required Arguments")
+    required_args.add_argument("--series", required=True, type=str,
+                               help='Name of directory containing series data. (e.x. "simresults/MX5")')
+    required_args.add_argument("--sessions", required=True, nargs="+",
+                               help='List of names of session tables in results CSVs from this series. (e.x. "Qualify result" "Race 1 result" "Race 2 result")')
+    required_args.add_argument("--rounds-to-include", required=True, type=int,
+                               help="Number of series rounds that have been run, the rest of the tracks table is simulated.")
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--drop-week", action="store_true",
+                               help="Whether this series has a drop week that needs to factor into points calculations.")
+    optional_args.add_argument("--num-scoring-drivers-in-team", type=int, default=2,
+                               help="How many driver contribute to the team score per round.")
+    optional_args.add_argument("--no-cache", action="store_true",
+                               help="Re-read and re-clean every round's CSV instead of reusing tables cached by previous runs.")
+    optional_args.add_argument("--seasons", type=int, default=100000, help="Number of seasons to simulate.")
+    optional_args.add_argument("--batch-size", type=int, default=10000,
+                               help="Number of seasons simulated at once, bounds memory use.")
+    optional_args.add_argument("--seed", type=int,
+                               help="Seed to reproduce a projection with. (default: a random seed, which is logged)")
+    optional_args.add_argument("--jobs", type=int, default=1, help="Number of processes to simulate batches with.")
+
+    return parser.parse_args()
+
+
+def run(args):
+    cache = None
+    if not args.no_cache:
+        cache = RaceReportCache(os.path.join(args.series, RaceReportCache.default_cache_directory_name))
+    championship = Championship(args.series, args.sessions, args.rounds_to_include, args.drop_week,
+                                args.num_scoring_drivers_in_team, cache=cache)
+    projection = ChampionshipProjection(championship, args.seasons, args.batch_size, args.seed, args.jobs)
+
+    for projection_table in [projection.drivers_projection_table, projection.teams_projection_table]:
+        print(projection_table.to_string(formatters={"expected_points": "{:.1f}".format,
+                                                     "expected_pos": "{:.2f}".format,
+                                                     "title": "{:.2%}".format}))
+        print()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run(parse_args())
@@ -0,0 +1,185 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import Profiling
+import Utils
+from Championship import Championship
+from RaceReportCache import RaceReportCache
+
+logger = logging.getLogger(__name__)
+
+CLINCHED = "clinched"
+ALIVE = "alive"
+ELIMINATED = "eliminated"
+
+
+class ClinchCalculator:
+
+    # Lowest and highest final points every series driver and team can still reach over the rounds not yet included in
+    # the championship, and whether they've clinched the title, can still win it or are eliminated from it
+    # Drivers don't have to enter a round, so anyone can score nothing in the remaining rounds and anyone can win all of
+    # them while everyone else scores nothing, which makes the bounds the exact reachable extremes (a team's maximum
+    # with drop weeks is an upper bound)
+    @Profiling.timed("clinch calculator")
+    def __init__(self, championship):
+        self.championship = championship
+        self.num_remaining_rounds = len(championship.series_tracks_table) - championship.rounds_to_include
+
+        race_report = next(iter(championship.race_reports.values()))
+        grid_from_quali = np.array([race_report.race_session_grid_determined_by[session] in race_report.quali_sessions
+                                    for session in championship.series_race_sessions])
+        # most points 1 to n different finishers can score in one race and in one qualifying, remaining rounds are
+        # assumed to have the same race sessions as the included ones
+        scoring_table = championship.series_scoring_table
+        self._best_points = np.concatenate([[0], np.cumsum(np.sort(scoring_table["points"].values)[::-1])])
+        self._best_quali_points = np.concatenate(
+            [[0], np.cumsum(np.sort(scoring_table["quali_points"].values)[::-1])])
+        self._num_races = len(grid_from_quali)
+        self._num_quali_scoring_races = int(grid_from_quali.sum())
+
+        self.drivers_clinch_table = self._construct_drivers_clinch_table()
+        self.teams_clinch_table = self._construct_teams_clinch_table()
+
+    # Most points num_finishers drivers can score together in one weekend, for an array of num_finishers
+    def _get_max_weekend_points(self, num_finishers):
+        num_finishers = np.minimum(num_finishers, len(self._best_points) - 1)
+        return self._num_races * self._best_points[num_finishers] + \
+            self._num_quali_scoring_races * self._best_quali_points[num_finishers]
+
+    # Clinched when the lowest reachable points beat everyone else's highest, eliminated when someone else's lowest
+    # beats the highest reachable points, tied bounds are alive since countback can go either way
+    # Once no rounds remain the standings are final and only the leader, the first row, has clinched
+    def _get_statuses(self, min_points, max_points):
+        statuses = np.full(len(min_points), ALIVE, dtype=object)
+        if self.num_remaining_rounds == 0 or len(min_points) < 2:
+            statuses[:] = ELIMINATED
+            statuses[0:1] = CLINCHED
+            return statuses
+
+        others_max_points = self._get_others_max(max_points)
+        others_min_points = self._get_others_max(min_points)
+        statuses[min_points > others_max_points] = CLINCHED
+        statuses[max_points < others_min_points] = ELIMINATED
+        return statuses
+
+    # Highest value among all the other rows, for every row
+    @staticmethod
+    def _get_others_max(values):
+        top_two = np.argsort(values, kind="stable")[-2:]
+        others_max = np.full(len(values), values[top_two[1]])
+        others_max[top_two[1]] = values[top_two[0]]
+        return others_max
+
+    @Profiling.timed("construct drivers clinch table")
+    def _construct_drivers_clinch_table(self):
+        championship = self.championship
+        all_drivers_totals_table = championship._all_drivers_totals_table
+        weekends = list(championship.race_reports)
+        # participants in standings order, then drivers yet to participate in drivers table order
+        drivers = championship.drivers_totals_table.index.append(
+            all_drivers_totals_table.index.difference(championship.drivers_totals_table.index, sort=False))
+        drivers_totals_table = all_drivers_totals_table.loc[drivers]
+
+        total = drivers_totals_table["total"].values
+        max_total = total + self.num_remaining_rounds * self._get_max_weekend_points(1)
+        if not championship.drop_week:
+            min_points, max_points = total, max_total
+        elif self.num_remaining_rounds == 0:
+            min_points = max_points = drivers_totals_table["total_with_drop_week"].values
+        else:
+            # scoring nothing in a remaining round makes it the drop week, winning every remaining round leaves the drop
+            # week at the lowest included weekend
+            min_points = total
+            max_points = max_total - drivers_totals_table[weekends].values.min(axis=1)
+
+        totals_column = "total_with_drop_week" if championship.drop_week else "total"
+        drivers_clinch_table = pd.DataFrame({"points": drivers_totals_table[totals_column].values,
+                                             "min_points": min_points, "max_points": max_points}, index=drivers)
+        drivers_clinch_table["status"] = self._get_statuses(min_points, max_points)
+        logger.debug("computed drivers clinch table")
+        return drivers_clinch_table
+
+    @Profiling.timed("construct teams clinch table")
+    def _construct_teams_clinch_table(self):
+        championship = self.championship
+        drivers_teams = championship.series_drivers_table["team"]
+        drivers_teams = drivers_teams[drivers_teams.notna() & (drivers_teams != Utils.NO_TEAM)]
+        # teams in standings order, then teams whose drivers are yet to participate
+        teams = championship.teams_totals_table.index.append(
+            pd.Index(drivers_teams.unique()).difference(championship.teams_totals_table.index, sort=False))
+
+        total = championship._teams_weekend_totals_table.sum(axis=1).reindex(teams, fill_value=0).values
+        total_with_drop_week = championship._teams_weekend_totals_with_drop_week_table.sum(axis=1).reindex(
+            teams, fill_value=0).values
+        # a team's best weekend is its top scoring drivers finishing in the top positions of every session
+        num_scoring_drivers = np.minimum(drivers_teams.value_counts().reindex(teams).values,
+                                         championship.num_scoring_drivers_in_team)
+        max_total = total + self.num_remaining_rounds * self._get_max_weekend_points(num_scoring_drivers)
+        if not championship.drop_week:
+            min_points, max_points = total, max_total
+        elif self.num_remaining_rounds == 0:
+            min_points = max_points = total_with_drop_week
+        else:
+            # scoring nothing in a remaining round moves every driver's drop week there, and teammates rotating out of
+            # remaining rounds can do the same while the team still scores its best, so deleted weekends can all come
+            # back and the maximum is only bounded by the total without them
+            min_points, max_points = total, max_total
+
+        teams_clinch_table = pd.DataFrame({"points": total_with_drop_week if championship.drop_week else total,
+                                           "min_points": min_points, "max_points": max_points},
+                                          index=teams.rename("team"))
+        teams_clinch_table["status"] = self._get_statuses(min_points, max_points)
+        logger.debug("computed teams clinch table")
+        return teams_clinch_table
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Show which drivers and teams have clinched a series' title, can still win it or are eliminated from it, from the most and fewest points each can still reach in the remaining rounds.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required_args = parser.add_argument_group(title="Required Arguments")
+    required_args.add_argument("--series", required=True, type=str,
+                               help='Name of directory containing series data. (e.x. "simresults/MX5")')
+    required_args.add_argument("--sessions", required=True, nargs="+",
+                               help='List of names of session tables in results CSVs from this series. (e.x. "Qualify result" "Race 1 result" "Race 2 result")')
+    required_args.add_argument("--rounds-to-include", required=True, type=int,
+                               help="Number of series rounds that have been run, the rest of the tracks table is remaining.")
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--drop-week", action="store_true",
+                               help="Whether this series has a drop week that needs to factor into points calculations.")
+    optional_args.add_argument("--num-scoring-drivers-in-team", type=int, default=2,
+                               help="How many driver contribute to the team score per round.")
+    optional_args.add_argument("--no-cache", action="store_true",
+                               help="Re-read and re-clean every round's CSV instead of reusing tables cached by previous runs.")
+    optional_args.add_argument("--all", action="store_true",
+                               help="Also show eliminated drivers and teams.")
+
+    return parser.parse_args()
+
+
+def run(args):
+    cache = None
+    if not args.no_cache:
+        cache = RaceReportCache(os.path.join(args.series, RaceReportCache.default_cache_directory_name))
+    championship = Championship(args.series, args.sessions, args.rounds_to_include, args.drop_week,
+                                args.num_scoring_drivers_in_team, cache=cache)
+    clinch_calculator = ClinchCalculator(championship)
+
+    print("{} of {} rounds remaining".format(clinch_calculator.num_remaining_rounds,
+                                            len(championship.series_tracks_table)))
+    for clinch_table in [clinch_calculator.drivers_clinch_table, clinch_calculator.teams_clinch_table]:
+        if not args.all:
+            clinch_table = clinch_table[clinch_table["status"] != ELIMINATED]
+        print(clinch_table.to_string())
+        print()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    run(parse_args())
@@ -31,9 +31,13 @@ class DriversStandingsWriter(TableWriter):
         return lines_buffer
 
     def _generate_table_rows(self):
-        lines_buffer = []
+        # totals table rows are in the same standings order as the points table rows
+        drivers_totals = self.championship.drivers_totals_table["total"].tolist()
+        drivers_totals_with_drop_week = self.championship.drivers_totals_table["total_with_drop_week"].tolist()
 
         for pos, driver in enumerate(self.championship.drivers_points_table.index):
+            driver_total = drivers_totals[pos]
+            driver_total_with_drop_week = drivers_totals_with_drop_week[pos]
             pos += 1
 
             driver_row_pos = self.standing_row_pos_format.format(pos_width=self.pos_width, pos=pos)
@@ -42,11 +46,7 @@ class DriversStandingsWriter(TableWriter):
 
             driver_row_substrings = [driver_row_pos, driver_row_driver, driver_row_results_list]
 
-            driver_totals = self.championship.drivers_totals_table.loc[driver]
-            driver_total = driver_totals["total"]
-
             if self.championship.drop_week:
-                driver_total_with_drop_week = driver_totals["total_with_drop_week"]
                 points_string = "**{}**".format(driver_total_with_drop_week)
                 if not driver_total_with_drop_week == driver_total:
                     points_string = "{}^^{}^^".format(points_string, driver_total)
@@ -58,9 +58,7 @@ class DriversStandingsWriter(TableWriter):
             driver_row_substrings.append(driver_row_points)
 
             driver_row = "".join(driver_row_substrings)
-            lines_buffer.append(driver_row)
-
-        return lines_buffer
+            yield driver_row
 
 
 if __name__ == "__main__":
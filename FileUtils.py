@@ -0,0 +1,69 @@
+import contextlib
+import csv
+import hashlib
+import os
+
+# Series file helpers that don't need pandas, so the command line tools can check a series' inputs and outputs before
+# paying for importing it (Utils re-exports them for the rest of the code)
+
+
+# Hex digest of a file's contents, used to detect when series input files change
+def get_file_hash(file_path):
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 16), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+# Hashes of a series' tables and every csv in the given rounds' directories, by file path
+def get_series_input_hashes(series_directory, tracks):
+    input_files = [os.path.join(series_directory, table_file) for table_file in
+                   ["drivers_table.csv", "points_table.csv", "tracks_table.csv"]]
+    for track in tracks:
+        race_path = os.path.join(series_directory, track)
+        if os.path.isdir(race_path):
+            input_files += [os.path.join(race_path, file) for file in sorted(os.listdir(race_path)) if
+                            file.endswith(".csv")]
+    return {input_file: get_file_hash(input_file) for input_file in input_files}
+
+
+# Simresults csv a round is read from, the first csv in its directory, or None if it has none
+def get_results_file(race_directory_path):
+    csv_files = [file for file in os.listdir(race_directory_path) if file.endswith(".csv")]
+    if len(csv_files) < 1:
+        return None
+    return os.path.join(race_directory_path, csv_files[0])
+
+
+# Series track info as (directory, csv_manual_adjustment) in round order, the tracks table columns Utils.read_tracks_table
+# indexes and cleans
+def read_tracks_rounds(series_directory):
+    with open(os.path.join(series_directory, "tracks_table.csv"), newline="", encoding="utf-8") as fp:
+        return [(row["directory"], int(row["csv_manual_adjustment"])) for row in csv.DictReader(fp)]
+
+
+# Open a file for writing through a temp file next to it, the file is only replaced once the temp file is fully written
+# so a crash never leaves a half written file behind
+# With keep_unchanged a file whose contents wouldn't change is left as it is, so its modified time only moves on changes
+@contextlib.contextmanager
+def open_atomic(file_path, mode="w", keep_unchanged=False):
+    temp_file = "{}.{}.tmp".format(file_path, os.getpid())
+    try:
+        with open(temp_file, mode) as fp:
+            yield fp
+        if not (keep_unchanged and os.path.isfile(file_path) and get_file_hash(file_path) == get_file_hash(temp_file)):
+            os.replace(temp_file, file_path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+# Stream lines to a file, writes the same text as "\n".join(lines) + "\n\n" without building it in memory
+def write_lines(fp, lines):
+    separator = ""
+    for line in lines:
+        fp.write(separator)
+        fp.write(line)
+        separator = "\n"
+    fp.write("\n\n")
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+import os
+
+import FileUtils
+
+logger = logging.getLogger(__name__)
+
+
+class OutputManifest:
+    # Bump when the table writers' output changes so outputs written by older code are regenerated
+    # 2: teams tied on points are ranked by countback
+    manifest_version = 2
+
+    default_manifest_file_name = ".simresults_manifest.json"
+
+    # Hashes of the inputs each of a series' outputs was written from and of what was written, by default kept in the
+    # series directory, outputs whose inputs and contents are unchanged since the last run don't need to be written again
+    def __init__(self, series_directory, manifest_file_name=default_manifest_file_name):
+        self.series_directory = series_directory
+        self.manifest_file = os.path.join(series_directory, manifest_file_name)
+        self.outputs = self._load()
+        self.changed_outputs = []
+
+    def _load(self):
+        if not os.path.isfile(self.manifest_file):
+            return {}
+        try:
+            with open(self.manifest_file) as fp:
+                manifest = json.load(fp)
+        except (OSError, ValueError):
+            logger.warning("ignoring unreadable output manifest: %s", self.manifest_file)
+            return {}
+        if manifest.get("manifest_version") != self.manifest_version:
+            return {}
+        return manifest["outputs"]
+
+    def save(self):
+        with FileUtils.open_atomic(self.manifest_file) as fp:
+            json.dump({"manifest_version": self.manifest_version, "outputs": self.outputs}, fp, indent=2,
+                      sort_keys=True)
+        logger.debug("saved output manifest: %s", self.manifest_file)
+
+    # Key covering every input of an output, any change to them makes a new key
+    @staticmethod
+    def get_inputs_key(key_parts):
+        key_hash = hashlib.sha256()
+        for key_part in key_parts:
+            key_hash.update(str(key_part).encode())
+            key_hash.update(b"\0")
+        return key_hash.hexdigest()
+
+    # Standings tables depend on the championship settings, the series tables and every included round's csvs
+    @staticmethod
+    def get_championship_inputs_key(championship):
+        return OutputManifest.get_standings_inputs_key(
+            championship.series, championship.series_sessions, championship.rounds_to_include, championship.drop_week,
+            championship.num_scoring_drivers_in_team,
+            championship.series_tracks_table.index[0:championship.rounds_to_include])
+
+    # The same key from the settings and the included rounds' directories, without reading the series
+    @staticmethod
+    def get_standings_inputs_key(series_directory, series_sessions, rounds_to_include, drop_week,
+                                 num_scoring_drivers_in_team, tracks):
+        input_hashes = FileUtils.get_series_input_hashes(series_directory, tracks)
+        return OutputManifest.get_inputs_key(
+            [rounds_to_include, drop_week, num_scoring_drivers_in_team] + list(series_sessions) +
+            [part for item in sorted(input_hashes.items()) for part in item])
+
+    # A race report depends only on its round's csv and how it's read, and the series drivers and points tables
+    @staticmethod
+    def get_race_report_inputs_key(race_report):
+        return OutputManifest.get_round_inputs_key(
+            os.path.dirname(race_report.race_directory_path), race_report.results_file,
+            race_report.csv_manual_adjustment, race_report.session_names)
+
+    @staticmethod
+    def get_round_inputs_key(series_directory, results_file, csv_manual_adjustment, session_names):
+        return OutputManifest.get_inputs_key(
+            [os.path.basename(results_file), FileUtils.get_file_hash(results_file),
+             FileUtils.get_file_hash(os.path.join(series_directory, "drivers_table.csv")),
+             FileUtils.get_file_hash(os.path.join(series_directory, "points_table.csv")),
+             csv_manual_adjustment] + list(session_names))
+
+    def _get_output_name(self, output_file):
+        return os.path.relpath(output_file, self.series_directory)
+
+    # Whether an output was last written from the same inputs and is still as it was written
+    def is_up_to_date(self, output_file, inputs_key):
+        entry = self.outputs.get(self._get_output_name(output_file))
+        return entry is not None and entry["inputs"] == inputs_key and os.path.isfile(output_file) and \
+            FileUtils.get_file_hash(output_file) == entry["output"]
+
+    # Record the inputs an output was just written from, it's a changed output if its contents differ from last time
+    def record(self, output_file, inputs_key):
+        output_name = self._get_output_name(output_file)
+        output_hash = FileUtils.get_file_hash(output_file)
+        entry = self.outputs.get(output_name)
+        if entry is None or entry["output"] != output_hash:
+            self.changed_outputs.append(output_file)
+        self.outputs[output_name] = {"inputs": inputs_key, "output": output_hash}
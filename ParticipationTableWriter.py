@@ -28,7 +28,7 @@ class ParticipationTableWriter(TableWriter):
         return lines_buffer
 
     def _generate_driver_and_participation_row(self, driver):
-        number = self.championship.series_drivers_table.loc[driver, "number"]
+        number = self.render_cache.driver_numbers[driver]
         row_number = self.row_number_format.format(number_width=self.number_width, number=number)
 
         driver_flag_and_name = self._generate_driver_flag_and_name(driver, self.driver_width)
@@ -40,8 +40,6 @@ class ParticipationTableWriter(TableWriter):
         return "".join(substrings)
 
     def _generate_table_rows(self):
-        lines_buffer = []
-
         for team in self.championship.teams_and_drivers_table.index:
             drivers_list = self.championship.teams_and_drivers_table.loc[team, "drivers_list"]
 
@@ -50,12 +48,10 @@ class ParticipationTableWriter(TableWriter):
 
             row_substrings = [row_team, row_driver_and_participation]
             row = "".join(row_substrings)
-            lines_buffer.append(row)
+            yield row
 
             for driver in drivers_list[1:]:
-                lines_buffer.append(self._generate_driver_and_participation_row(driver))
-
-        return lines_buffer
+                yield self._generate_driver_and_participation_row(driver)
 
 
 if __name__ == "__main__":
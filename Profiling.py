@@ -0,0 +1,114 @@
+import contextlib
+import functools
+import json
+import os
+import time
+
+# Spans are only recorded once enabled, until then span() costs one flag check
+_enabled = False
+_root_spans = []
+_open_spans = []
+
+
+class Span:
+
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.children = []
+        # spans recorded in worker processes are shown on their own row of the trace
+        self.process_id = os.getpid()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    _root_spans.clear()
+    _open_spans.clear()
+
+
+def get_root_spans():
+    return list(_root_spans)
+
+
+# Time the block as a span nested in the currently open span (e.x. with Profiling.span("read race reports"): ...)
+@contextlib.contextmanager
+def span(name):
+    if not _enabled:
+        yield None
+        return
+
+    current_span = Span(name, time.perf_counter())
+    (_open_spans[-1].children if _open_spans else _root_spans).append(current_span)
+    _open_spans.append(current_span)
+    try:
+        yield current_span
+    finally:
+        current_span.duration = time.perf_counter() - current_span.start
+        _open_spans.pop()
+
+
+# Add spans recorded in another process, e.x. a pool worker's, to the currently open span
+def add_spans(spans):
+    if _enabled:
+        (_open_spans[-1].children if _open_spans else _root_spans).extend(spans)
+
+
+# Indented tree of the recorded spans with their durations and share of their root span
+def format_tree():
+    lines = []
+
+    def add_span_lines(span_node, depth, root_duration):
+        share = 100 * span_node.duration / root_duration if root_duration else 100.0
+        lines.append("{:<60} {:>9.4f}s {:>6.1f}%".format("  " * depth + span_node.name, span_node.duration, share))
+        for child in span_node.children:
+            add_span_lines(child, depth + 1, root_duration)
+
+    for root_span in _root_spans:
+        if root_span.duration is not None:
+            add_span_lines(root_span, 0, root_span.duration)
+    return "\n".join(lines)
+
+
+# Write the recorded spans as a Chrome trace event JSON file, which chrome://tracing and Perfetto can open
+def write_trace(trace_file):
+    trace_events = []
+    pid = os.getpid()
+    start = min((root_span.start for root_span in _root_spans), default=0)
+
+    def add_span_events(span_node):
+        if span_node.duration is None:
+            return
+        trace_events.append({"name": span_node.name, "ph": "X", "pid": pid,
+                             "tid": 0 if span_node.process_id == pid else span_node.process_id,
+                             "ts": round((span_node.start - start) * 1e6, 3),
+                             "dur": round(span_node.duration * 1e6, 3)})
+        for child in span_node.children:
+            add_span_events(child)
+
+    for root_span in _root_spans:
+        add_span_events(root_span)
+
+    with open(trace_file, "w") as fp:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, fp)
+
+
+# Decorator timing every call of a function as a span
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return timed_function
+
+    return decorator
@@ -1,17 +1,24 @@
+import logging
 import os
 import re
 
 import numpy as np
 import pandas as pd
 
+import Profiling
 import Utils
+from SimresultsFile import SimresultsFile
+
+logger = logging.getLogger(__name__)
 
 
 class RaceReport:
 
     # Constructor, optionally pass in already-parsed drivers and points table info and whether to debug print csv lines when parsing
+    # Pass a RaceReportCache to reuse tables cleaned by a previous run when none of their inputs changed
+    # With read_laps, each session's laps section is also parsed into lap_tables, see SimresultsFile.read_laps
     def __init__(self, session_names, series_directory, race_directory, drivers_table=None, scoring_table=None,
-                 csv_manual_adjustment=0, debug_csv_parse=False):
+                 csv_manual_adjustment=0, debug_csv_parse=False, cache=None, read_laps=False):
 
         self.session_names = session_names
         self.debug_csv_parse = debug_csv_parse
@@ -23,15 +30,13 @@ class RaceReport:
         self.race_directory_path = os.path.join(series_directory, race_directory)
         assert os.path.isdir(self.race_directory_path), "Race directory path does not exist: {}".format(
             self.race_directory_path)
-        print("creating race report:", self.race_directory_path)
+        logger.info("creating race report: %s", self.race_directory_path)
 
-        csv_files = [file for file in os.listdir(self.race_directory_path) if file.endswith(".csv")]
-        if len(csv_files) < 1:
+        self.results_file = Utils.get_results_file(self.race_directory_path)
+        if self.results_file is None:
             raise FileNotFoundError()
-        simresults_file_name = [file for file in os.listdir(self.race_directory_path) if file.endswith(".csv")][0]
-        simresults_code = os.path.splitext(simresults_file_name)[0]
-        self.results_file = os.path.join(self.race_directory_path, "{}.csv".format(simresults_code))
-        print("reading results file:", self.results_file)
+        simresults_code = os.path.splitext(os.path.basename(self.results_file))[0]
+        logger.info("reading results file: %s", self.results_file)
 
         self.simresults_url = "https://simresults.net/{}".format(simresults_code)
 
@@ -40,8 +45,35 @@ class RaceReport:
         self.race_session_grid_determined_by = self._get_race_session_grid_determined_by()
 
         self.csv_manual_adjustment = csv_manual_adjustment
-        self.tables = self._read_results_tables()
-        self._clean_results_tables()
+
+        cache_key = None
+        self.tables = None
+        if cache is not None:
+            cache_key = cache.get_key(self.results_file, series_directory, self.session_names,
+                                      self.csv_manual_adjustment)
+            # the csv lines are only printed while reading the tables, so --debug-csv-parse always reads them
+            if not self.debug_csv_parse:
+                self.tables = cache.load(cache_key)
+
+        results_file = None
+        if self.tables is None:
+            results_file = SimresultsFile(self.results_file)
+            self.tables = self._read_results_tables(results_file)
+            self._clean_results_tables()
+            if cache is not None:
+                cache.store(cache_key, self.tables)
+
+        self.lap_tables = None
+        if read_laps:
+            laps_cache_key = None
+            if cache is not None:
+                laps_cache_key = cache.get_key(self.results_file, series_directory, self.session_names,
+                                               self.csv_manual_adjustment, kind="laps")
+                self.lap_tables = cache.load(laps_cache_key)
+            if self.lap_tables is None:
+                self.lap_tables = self._read_lap_tables(results_file or SimresultsFile(self.results_file))
+                if cache is not None:
+                    cache.store(laps_cache_key, self.lap_tables)
 
     # Get attached qualifying or previous race to get starting positions
     def _get_race_session_grid_determined_by(self):
@@ -68,38 +100,49 @@ class RaceReport:
         return race_session_grid_determined_by
 
     # Return race result pandas dataframes in dict keyed by session_names
-    def _read_results_tables(self):
-
-        rows = {name: [0, 0] for name in self.session_names}
-        with open(self.results_file) as fp:
-            current_table = ""
-            for i, row in enumerate(fp):
-                if current_table:
-                    if row == "\n":
-                        rows[current_table][1] = i
-                        print("ending line {}".format(rows[current_table][1]))
-                        current_table = ""
-                    elif i >= rows[current_table][0]:
-                        if self.debug_csv_parse: print(row, end="")
-                else:
-                    for name in self.session_names:
-                        if row.startswith(name):
-                            current_table = name
-                            rows[current_table][0] = i + 2
-                            print("found table '{}' starting line {} ".format(current_table, rows[current_table][0]))
+    # The results file is read and its sections indexed once, each table is parsed from its slice of the in-memory file
+    @Profiling.timed("read results tables")
+    def _read_results_tables(self, results_file=None):
+
+        if results_file is None:
+            results_file = SimresultsFile(self.results_file)
 
         tables = {}
         for name in self.session_names:
-            table_skiprows = rows[name][0] + self.csv_manual_adjustment
-            table_nrows = rows[name][1] - table_skiprows - 1 + self.csv_manual_adjustment
-            table_df = pd.read_csv(self.results_file, skiprows=table_skiprows, nrows=table_nrows, index_col=False,
-                                   skipinitialspace=True, quotechar='"', dtype=object)
-            print("read to dataframe:", name)
+            _, title_line, end_line, _ = results_file.find_section(name)
+            logger.debug("found table '%s' starting line %d ending line %d", name, title_line + 2, end_line)
+            if self.debug_csv_parse:
+                logger.info("csv lines of table '%s':\n%s", name,
+                            results_file.get_table_text(name, self.csv_manual_adjustment).rstrip("\n"))
+
+            table_df = results_file.read_table(name, self.csv_manual_adjustment)
+            logger.debug("read to dataframe: %s", name)
             tables[name] = table_df
 
         return tables
 
+    # Return lap tables in dict keyed by session_names, read from each session's laps section (e.x. "Race 1 laps")
+    @Profiling.timed("read lap tables")
+    def _read_lap_tables(self, results_file):
+        lap_tables = {}
+        for name in self.session_names:
+            laps_section_name = re.sub(" result$", " laps", name)
+            lap_tables[name] = results_file.read_laps(laps_section_name)
+            logger.debug("read laps: %s", laps_section_name)
+        return lap_tables
+
+    # Pace and consistency of each driver in a session from its lap table, pit laps and laps without a time are left out
+    def get_lap_stats(self, name):
+        assert self.lap_tables is not None, "race report was created without read_laps"
+        lap_table = self.lap_tables[name]
+        lap_table = lap_table[~lap_table["pit"] & (lap_table["time_ms"] > 0)]
+        lap_stats = lap_table.groupby("driver", observed=True)["time_ms"].agg(["count", "min", "median", "mean", "std"])
+        lap_stats.columns = ["laps", "best_ms", "median_ms", "mean_ms", "std_ms"]
+        lap_stats["consistency"] = 100 * lap_stats["best_ms"] / lap_stats["mean_ms"]
+        return lap_stats
+
     # Clean race result dataframes, cast numerical columns to integers, join points information and starting positions to driver rows
+    @Profiling.timed("clean results tables")
     def _clean_results_tables(self):
 
         # Merge starting position info to grid column of a race table from either quali session or previous race, optionally adding quali points column
@@ -186,5 +229,5 @@ class RaceReport:
             for driver in table_df["Driver"]:
                 assert driver in self.drivers_table.index, "{} not found in drivers table".format(driver)
 
-            print("cleaned dataframe:", name)
+            logger.debug("cleaned dataframe: %s", name)
             self.tables[name] = table_df
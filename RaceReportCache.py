@@ -0,0 +1,69 @@
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+
+import FileUtils
+import Profiling
+
+logger = logging.getLogger(__name__)
+
+
+class RaceReportCache:
+    # Bump when RaceReport parsing/cleaning changes so tables cleaned by older code are not reused
+    cache_version = 2
+
+    default_cache_directory_name = ".simresults_cache"
+
+    # Content-addressed store of cleaned RaceReport tables, by default kept in the series directory
+    def __init__(self, cache_directory):
+        self.cache_directory = cache_directory
+
+    # Key covering every input of a race report's cleaned tables, any change to them makes a new key
+    # kind separates the kinds of tables cached for a race report (e.x. "tables", "laps")
+    def get_key(self, results_file, series_directory, session_names, csv_manual_adjustment, kind="tables"):
+        key_hash = hashlib.sha256()
+        key_parts = [str(self.cache_version), kind,
+                     FileUtils.get_file_hash(results_file),
+                     FileUtils.get_file_hash(os.path.join(series_directory, "drivers_table.csv")),
+                     FileUtils.get_file_hash(os.path.join(series_directory, "points_table.csv")),
+                     str(csv_manual_adjustment)] + list(session_names)
+        for key_part in key_parts:
+            key_hash.update(key_part.encode())
+            key_hash.update(b"\0")
+        return key_hash.hexdigest()
+
+    def _get_entry_file(self, key):
+        return os.path.join(self.cache_directory, "{}.pkl".format(key))
+
+    # Return the cached tables dict for a key, or None if it isn't cached
+    @Profiling.timed("cache load")
+    def load(self, key):
+        entry_file = self._get_entry_file(key)
+        if not os.path.isfile(entry_file):
+            return None
+        # besides a damaged file, an entry pickled under other pandas or numpy versions can fail with about any error
+        # (e.x. AttributeError, ModuleNotFoundError, TypeError), any of them is a miss and the round is read again
+        try:
+            with open(entry_file, "rb") as fp:
+                tables = pickle.load(fp)
+        except Exception as e:
+            logger.warning("ignoring unreadable cache entry %s: %s: %s", entry_file, type(e).__name__, e)
+            return None
+        logger.debug("loaded cached tables: %s", entry_file)
+        return tables
+
+    # Pickled dataframes keep their column blocks and exact dtypes, written atomically so a crash never leaves a partial entry
+    @Profiling.timed("cache store")
+    def store(self, key, tables):
+        os.makedirs(self.cache_directory, exist_ok=True)
+        entry_file = self._get_entry_file(key)
+        with FileUtils.open_atomic(entry_file, "wb") as fp:
+            pickle.dump(tables, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        logger.debug("stored cached tables: %s", entry_file)
+
+    def clear(self):
+        if os.path.isdir(self.cache_directory):
+            shutil.rmtree(self.cache_directory)
+            logger.info("cleared cache: %s", self.cache_directory)
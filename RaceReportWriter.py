@@ -1,7 +1,14 @@
+import logging
 import os
 
+import numpy as np
+
+import Profiling
+import Utils
 from RaceReport import RaceReport
 
+logger = logging.getLogger(__name__)
+
 
 class RaceReportWriter:
     # Race report table format strings TODO use parameterized print format like in TableWriter
@@ -21,104 +28,95 @@ class RaceReportWriter:
         self.race_report = race_report
         self.output_file_name = output_file_name
         self.output_file = os.path.join(self.race_report.race_directory_path, output_file_name)
-        print("writing race report tables to:", self.output_file)
-
-    # Generate quali table markdown from quali session dataframe, result is a list of lines
-    def generate_quali_table_strings(self, table_name):
-
-        table_df = self.race_report.tables[table_name]
+        logger.debug("writing race report tables to: %s", self.output_file)
 
-        lines_buffer = [table_name, self.quali_row_0, self.quali_row_1]
+    # Join a session table with its drivers' info from the drivers table, in session table order
+    def _get_session_drivers_info(self, table_df):
+        return self.race_report.drivers_table.loc[table_df["Driver"].values]
 
-        for i, df_row in table_df.iterrows():
+    # Emit formatted lines for the rows of a session table, the first row format is for a position 0 row
+    @staticmethod
+    def _format_rows(row_format_first, row_format, positions, *columns):
+        for position, *cells in zip(positions, *columns):
+            yield (row_format_first if position == 0 else row_format).format(position, *cells)
 
-            driver = df_row["Driver"]
-
-            driver_info = self.race_report.drivers_table.loc[driver]
-
-            position = i
-            number = driver_info["number"]
-            flag = driver_info["flag"]
-            name = driver_info["name"]
-            team = driver_info["team"] if driver_info["team"] else "Independent"
-            time = df_row["Best lap"]
-            if position == 1:
-                time = "**{}**".format(time)
+    # Generate quali table markdown from quali session dataframe, result is a generator of lines
+    def generate_quali_table_strings(self, table_name):
 
-            line = self.quali_row_2.format(position, number, flag, name, team,
-                                           time) if i == 0 else self.quali_row.format(position, number, flag, name,
-                                                                                      team, time)
-            lines_buffer.append(line)
+        table_df = self.race_report.tables[table_name]
+        drivers_info = self._get_session_drivers_info(table_df)
 
-        lines_buffer.append(self.quali_row_last.format(self.race_report.simresults_url))
+        positions = table_df.index.tolist()
+        teams = drivers_info["team"].where(drivers_info["team"].astype(bool), Utils.NO_TEAM)
+        times = ["**{}**".format(time) if position == 1 else time for position, time in
+                 zip(positions, table_df["Best lap"].tolist())]
 
-        return lines_buffer
+        yield table_name
+        yield self.quali_row_0
+        yield self.quali_row_1
+        yield from self._format_rows(self.quali_row_2, self.quali_row, positions, drivers_info["number"].tolist(),
+                                     drivers_info["flag"].tolist(), drivers_info["name"].tolist(), teams.tolist(),
+                                     times)
+        yield self.quali_row_last.format(self.race_report.simresults_url)
 
     def generate_race_table_strings(self, table_name):
 
         table_df = self.race_report.tables[table_name]
-
-        lines_buffer = [table_name, self.race_row_0, self.race_row_1]
-
-        for i, df_row in table_df.iterrows():
-
-            driver = df_row["Driver"]
-
-            driver_info = self.race_report.drivers_table.loc[driver]
-
-            position = i
-            number = driver_info["number"]
-            flag = driver_info["flag"]
-            name = driver_info["name"]
-            team = driver_info["team"]
-            laps = df_row["Laps"]
-            points = df_row["Points"]
-            timeorretired = df_row["Time/Retired"] if df_row["Time/Retired"] else "DNF"
-            grid = df_row["Grid"] if df_row["Grid"] > 0 else "DNQ"
-
-            if "Qualify Points" in table_df.columns:
-                points = str(df_row["Points"] + df_row["Qualify Points"]) + (
-                    "^^{}^^".format(grid) if df_row["Qualify Points"] > 0 else "")
-
-            line = self.race_row_2.format(position, number, flag, name, team, laps, timeorretired, grid,
-                                          points) if i == 0 else self.race_row.format(position, number, flag, name,
-                                                                                      team, laps, timeorretired, grid,
-                                                                                      points)
-            lines_buffer.append(line)
-
-        lines_buffer.append(self.race_row_last.format(self.race_report.simresults_url))
-
-        fastest_driver = table_df.loc[table_df["Best lap time"] == table_df["Best lap time"].min()].iloc[0]["Driver"]
-        fastest_driver_flag = self.race_report.drivers_table.loc[fastest_driver, "flag"]
-
-        fastest_time = table_df.loc[table_df["Driver"] == fastest_driver]["Best lap"].item()
-        lines_buffer.append(self.race_row_fastestlap.format(fastest_driver_flag, fastest_driver, fastest_time))
-
-        return lines_buffer
+        drivers_info = self._get_session_drivers_info(table_df)
+
+        positions = table_df.index.tolist()
+        times_or_retired = table_df["Time/Retired"].where(table_df["Time/Retired"].astype(bool), "DNF")
+        grids = table_df["Grid"].astype(object).where(table_df["Grid"] > 0, "DNQ")
+
+        points = table_df["Points"]
+        if "Qualify Points" in table_df.columns:
+            quali_points_grids = np.where(table_df["Qualify Points"] > 0, "^^" + grids.astype(str) + "^^", "")
+            points = (table_df["Points"] + table_df["Qualify Points"]).astype(str) + quali_points_grids
+
+        yield table_name
+        yield self.race_row_0
+        yield self.race_row_1
+        yield from self._format_rows(self.race_row_2, self.race_row, positions, drivers_info["number"].tolist(),
+                                     drivers_info["flag"].tolist(), drivers_info["name"].tolist(),
+                                     drivers_info["team"].tolist(), table_df["Laps"].tolist(),
+                                     times_or_retired.tolist(), grids.tolist(), points.tolist())
+        yield self.race_row_last.format(self.race_report.simresults_url)
+
+        # first driver in the table with the fastest lap
+        fastest_row = table_df["Best lap time"].argmin()
+        fastest_driver = table_df["Driver"].iloc[fastest_row]
+        fastest_driver_flag = drivers_info["flag"].iloc[fastest_row]
+        fastest_time = table_df["Best lap"].iloc[fastest_row]
+        yield self.race_row_fastestlap.format(fastest_driver_flag, fastest_driver, fastest_time)
+
+    # Generate a generator of lines of table markdown for a session
+    def generate_table_lines(self, name):
+        if name.startswith("Qualify"):  # TODO use new sessions lists
+            return self.generate_quali_table_strings(name)
+        elif name.startswith("Race"):
+            return self.generate_race_table_strings(name)
+        return iter(["error!"])
 
     # Generate table markdown for all table_names, result is map from table names to table markdown string
     def generate_tables_strings(self):
         tables_strings = {}
 
         for name in self.race_report.session_names:
-            lines_buffer = ["error!"]
-            if name.startswith("Qualify"):  # TODO use new sessions lists
-                lines_buffer = self.generate_quali_table_strings(name)
-            elif name.startswith("Race"):
-                lines_buffer = self.generate_race_table_strings(name)
-            tables_strings[name] = "\n".join(lines_buffer) + "\n\n"
+            tables_strings[name] = "\n".join(self.generate_table_lines(name)) + "\n\n"
 
         return tables_strings
 
     # Write table markdown for all table_names, optionally provide the generated table strings
+    # Without table strings each table's lines are streamed to the output file as they are generated
     def write_generated_tables(self, tables_strings=None):  # TODO rename stuff to 'align' with TableWriter interface
-        if not tables_strings:
-            tables_strings = self.generate_tables_strings()
-
-        with open(self.output_file, "w+") as fp:
+        with Profiling.span("{} {}".format(type(self).__name__, self.race_report.race_directory_path)), \
+                Utils.open_atomic(self.output_file, keep_unchanged=True) as fp:
             for name in self.race_report.session_names:
-                fp.write(tables_strings[name])
-                print("appended table {} to {}".format(name, self.output_file))
+                if tables_strings:
+                    fp.write(tables_strings[name])
+                else:
+                    Utils.write_lines(fp, self.generate_table_lines(name))
+                logger.debug("appended table %s to %s", name, self.output_file)
 
 
 if __name__ == "__main__":
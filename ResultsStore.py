@@ -0,0 +1,327 @@
+import argparse
+import logging
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+import FileUtils
+import Profiling
+import Utils
+from OutputManifest import OutputManifest
+from RaceReport import RaceReport
+from RaceReportCache import RaceReportCache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the tables below change, a database made by another version is emptied and ingested again
+store_version = 1
+
+# Every round of every ingested series, each round's session results with a row per driver and session, and optionally
+# its laps with a row per driver, session and lap
+# A result's kind is "race", "qualify" or "other", times are in integer milliseconds and missing values are null
+schema = """
+CREATE TABLE IF NOT EXISTS series (
+    series_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    directory TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    round_id INTEGER PRIMARY KEY,
+    series_id INTEGER NOT NULL REFERENCES series ON DELETE CASCADE,
+    track TEXT NOT NULL,
+    round INTEGER,
+    simresults_url TEXT NOT NULL,
+    inputs_key TEXT NOT NULL,
+    UNIQUE (series_id, track)
+);
+CREATE TABLE IF NOT EXISTS results (
+    round_id INTEGER NOT NULL REFERENCES rounds ON DELETE CASCADE,
+    session TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    driver TEXT NOT NULL,
+    team TEXT,
+    vehicle TEXT,
+    laps INTEGER,
+    best_lap_ms INTEGER,
+    points INTEGER,
+    quali_points INTEGER,
+    grid INTEGER,
+    dnf INTEGER
+);
+CREATE TABLE IF NOT EXISTS laps (
+    round_id INTEGER NOT NULL REFERENCES rounds ON DELETE CASCADE,
+    session TEXT NOT NULL,
+    driver TEXT NOT NULL,
+    lap INTEGER NOT NULL,
+    time_ms INTEGER,
+    sector_1_ms INTEGER,
+    sector_2_ms INTEGER,
+    sector_3_ms INTEGER,
+    pit INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rounds_track ON rounds (track);
+CREATE INDEX IF NOT EXISTS results_round_session ON results (round_id, session);
+CREATE INDEX IF NOT EXISTS results_driver ON results (driver, kind, pos);
+CREATE INDEX IF NOT EXISTS results_team ON results (team, kind, pos);
+CREATE INDEX IF NOT EXISTS results_session_pos ON results (session, pos);
+CREATE INDEX IF NOT EXISTS laps_round_session_driver ON laps (round_id, session, driver);
+"""
+
+# Results with the series and round they're from, the queries below select from it
+results_view = """
+SELECT series.name AS series, rounds.round AS round, rounds.track AS track, results.*
+FROM results JOIN rounds USING (round_id) JOIN series USING (series_id)
+"""
+
+
+class ResultsStore:
+
+    # Session results of any number of series in a SQLite database, a round is only read again when its csv, how it's
+    # read or the series drivers and points tables change
+    def __init__(self, database_file):
+        self.database_file = database_file
+        self.connection = sqlite3.connect(database_file)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != store_version:
+            logger.info("creating results store: %s", database_file)
+            with self.connection:
+                for table in ["laps", "results", "rounds", "series"]:
+                    self.connection.execute("DROP TABLE IF EXISTS {}".format(table))
+                self.connection.execute("PRAGMA user_version = {}".format(store_version))
+        self.connection.executescript(schema)
+
+    def close(self):
+        self.connection.close()
+
+    def _get_series_id(self, name, series_directory):
+        self.connection.execute("INSERT INTO series (name, directory) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET "
+                                "directory = excluded.directory", (name, series_directory))
+        return self.connection.execute("SELECT series_id FROM series WHERE name = ?", (name,)).fetchone()[0]
+
+    # Rounds of a series as (track, round number, csv_manual_adjustment), from its tracks table when it has one or
+    # else every directory with a csv in name order without round numbers
+    @staticmethod
+    def _get_series_rounds(series_directory):
+        if os.path.isfile(os.path.join(series_directory, "tracks_table.csv")):
+            return [(track, round_number, csv_manual_adjustment) for round_number, (track, csv_manual_adjustment) in
+                    enumerate(FileUtils.read_tracks_rounds(series_directory), 1)]
+        tracks = sorted(entry.name for entry in os.scandir(series_directory) if entry.is_dir() and
+                        FileUtils.get_results_file(entry.path) is not None)
+        return [(track, None, 0) for track in tracks]
+
+    # Bring a series' rounds in the store up to date with its directory, rounds whose inputs are unchanged are kept
+    # and rounds no longer in the series are removed
+    # Returns the tracks ingested, unchanged and failed with their errors
+    @Profiling.timed("ingest series")
+    def ingest_series(self, series_directory, session_names, name=None, read_laps=False, cache=None):
+        name = name or os.path.basename(os.path.normpath(series_directory))
+        ingested_tracks = []
+        unchanged_tracks = []
+        failed_tracks = []
+        with self.connection:
+            series_id = self._get_series_id(name, series_directory)
+            stored_keys = dict(self.connection.execute("SELECT track, inputs_key FROM rounds WHERE series_id = ?",
+                                                       (series_id,)))
+            series_rounds = self._get_series_rounds(series_directory)
+
+            drivers_table = None
+            scoring_table = None
+            for track, round_number, csv_manual_adjustment in series_rounds:
+                race_path = os.path.join(series_directory, track)
+                results_file = FileUtils.get_results_file(race_path) if os.path.isdir(race_path) else None
+                if results_file is None:
+                    logger.warning("no csv found for %s", race_path)
+                    continue
+                inputs_key = OutputManifest.get_inputs_key([OutputManifest.get_round_inputs_key(
+                    series_directory, results_file, csv_manual_adjustment, session_names), round_number, read_laps])
+                if stored_keys.get(track) == inputs_key:
+                    unchanged_tracks.append(track)
+                    continue
+
+                if drivers_table is None:
+                    drivers_table = Utils.read_drivers_table(series_directory)
+                    scoring_table = Utils.read_scoring_table(series_directory)
+                try:
+                    race_report = RaceReport(session_names, series_directory, track, drivers_table=drivers_table,
+                                             scoring_table=scoring_table, csv_manual_adjustment=csv_manual_adjustment,
+                                             cache=cache, read_laps=read_laps)
+                except Exception as e:
+                    # a round that can't be read is left out, the rest of the series is still ingested
+                    self.connection.execute("DELETE FROM rounds WHERE series_id = ? AND track = ?", (series_id, track))
+                    logger.warning("could not ingest %s: %s: %s", race_path, type(e).__name__, e)
+                    failed_tracks.append((track, "{}: {}".format(type(e).__name__, e)))
+                    continue
+                self._insert_round(series_id, track, round_number, inputs_key, race_report)
+                ingested_tracks.append(track)
+                logger.info("ingested round: %s", race_path)
+
+            removed_tracks = set(stored_keys) - {track for track, _, _ in series_rounds}
+            self.connection.executemany("DELETE FROM rounds WHERE series_id = ? AND track = ?",
+                                        [(series_id, track) for track in removed_tracks])
+        return ingested_tracks, unchanged_tracks, failed_tracks
+
+    def _insert_round(self, series_id, track, round_number, inputs_key, race_report):
+        self.connection.execute("DELETE FROM rounds WHERE series_id = ? AND track = ?", (series_id, track))
+        round_id = self.connection.execute(
+            "INSERT INTO rounds (series_id, track, round, simresults_url, inputs_key) VALUES (?, ?, ?, ?, ?)",
+            (series_id, track, round_number, race_report.simresults_url, inputs_key)).lastrowid
+
+        drivers_teams = race_report.drivers_table["team"]
+        for session, table in race_report.tables.items():
+            table = table.reset_index()
+            columns = {"pos": table["Pos"],
+                       "driver": table["Driver"],
+                       "team": drivers_teams.reindex(table["Driver"]).values,
+                       "vehicle": table.get("Vehicle"),
+                       "laps": table.get("Laps"),
+                       "best_lap_ms": (table["Best lap time"] - pd.Timestamp(1900, 1, 1)) // pd.Timedelta(
+                           milliseconds=1) if "Best lap time" in table else None,
+                       "points": table.get("Points"),
+                       "quali_points": table.get("Qualify Points"),
+                       "grid": table.get("Grid"),
+                       "dnf": table.get("DNF")}
+            rows = zip(*[_get_column_values(values, len(table)) for values in columns.values()])
+            self.connection.executemany(
+                "INSERT INTO results (round_id, session, kind, {}) VALUES (?, ?, ?, {})".format(
+                    ", ".join(columns), ", ".join("?" * len(columns))),
+                [(round_id, session, _get_session_kind(race_report, session)) + row for row in rows])
+
+        for session, lap_table in (race_report.lap_tables or {}).items():
+            columns = [lap_table["driver"].astype(str), lap_table["lap"]] + [
+                lap_table[column].where(lap_table[column] >= 0) for column in
+                ["time_ms", "sector_1_ms", "sector_2_ms", "sector_3_ms"]] + [lap_table["pit"]]
+            rows = zip(*[_get_column_values(values, len(lap_table)) for values in columns])
+            self.connection.executemany(
+                "INSERT INTO laps (round_id, session, driver, lap, time_ms, sector_1_ms, sector_2_ms, sector_3_ms, pit) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [(round_id, session) + row for row in rows])
+
+    # Result of any SQL query as a dataframe, the results_view subquery gives results with their series and track
+    def query(self, sql, parameters=()):
+        return pd.read_sql_query(sql, self.connection, params=parameters)
+
+    # Race wins, of one driver or everyone, in one series or all of them
+    def get_wins(self, driver=None, series=None):
+        return self.query(
+            "SELECT series, round, track, session, driver, team FROM ({}) WHERE kind = 'race' AND pos = 1 AND "
+            "(:driver IS NULL OR driver = :driver) AND (:series IS NULL OR series = :series) "
+            "ORDER BY series, round, track, session".format(results_view), {"driver": driver, "series": series})
+
+    # Number of first places in sessions of a kind by driver or team, most first
+    def _get_first_place_counts(self, count_name, kind, by, series):
+        assert by in ["driver", "team"], "counts are by driver or team: {}".format(by)
+        return self.query(
+            "SELECT {by}, COUNT(*) AS {count_name} FROM ({view}) WHERE kind = :kind AND pos = 1 AND "
+            "{by} IS NOT NULL AND (:series IS NULL OR series = :series) GROUP BY {by} "
+            "ORDER BY {count_name} DESC, {by}".format(by=by, count_name=count_name, view=results_view),
+            {"kind": kind, "series": series})
+
+    def get_win_counts(self, by="driver", series=None):
+        return self._get_first_place_counts("wins", "race", by, series)
+
+    # Qualifying sessions topped, the pole of the race that takes its grid from them
+    def get_pole_counts(self, by="driver", series=None):
+        return self._get_first_place_counts("poles", "qualify", by, series)
+
+
+# "race", "qualify" or "other" for practice and any other session
+def _get_session_kind(race_report, session):
+    if session in race_report.race_sessions:
+        return "race"
+    if session in race_report.quali_sessions:
+        return "qualify"
+    return "other"
+
+
+# Python values of a column for sqlite, missing values as None, or all None for a column the table doesn't have
+def _get_column_values(values, length):
+    if values is None:
+        return [None] * length
+    values = pd.Series(values)
+    if pd.api.types.is_float_dtype(values):
+        values = values.astype("Int64")
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Ingest the session results of several series into a SQLite database, re-reading only rounds whose csv changed, and query results across series and seasons.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required_args = parser.add_argument_group(title="Required Arguments")
+    required_args.add_argument("--database", required=True, type=str,
+                               help='SQLite database file to ingest into and query. (e.x. "simresults/results.db")')
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--manifest", type=str,
+                               help="JSON list of series to ingest in the BatchResultsToTable.py manifest format, only their series and sessions are used.")
+    optional_args.add_argument("--series", type=str,
+                               help='Name of directory containing series data to ingest. (e.x. "simresults/MX5")')
+    optional_args.add_argument("--sessions", nargs="+",
+                               help='List of names of session tables in results CSVs from --series. (e.x. "Qualify result" "Race 1 result" "Race 2 result")')
+    optional_args.add_argument("--laps", action="store_true", help="Also ingest every driver's laps.")
+    optional_args.add_argument("--no-cache", action="store_true",
+                               help="Re-read and re-clean every changed round's CSV instead of reusing tables cached by previous runs.")
+    optional_args.add_argument("--wins", nargs="?", const="", metavar="DRIVER",
+                               help="Print the race wins of a driver, or of every driver when no driver is given.")
+    optional_args.add_argument("--win-counts", action="store_true", help="Print the number of race wins by --by.")
+    optional_args.add_argument("--pole-counts", action="store_true", help="Print the number of poles by --by.")
+    optional_args.add_argument("--by", choices=["driver", "team"], default="driver",
+                               help="Count wins and poles by driver or by team.")
+    optional_args.add_argument("--in-series", type=str,
+                               help="Only query results from the series with this name, its directory name.")
+    optional_args.add_argument("--sql", type=str, help="Print the results of any SQL query on the database.")
+    optional_args.add_argument("--quiet", action="store_true", help="Only log warnings and errors, not progress.")
+
+    args = parser.parse_args()
+    if args.series and not args.sessions:
+        parser.error("--series needs --sessions")
+    return args
+
+
+def run(args):
+    store = ResultsStore(args.database)
+    try:
+        series_to_ingest = []
+        if args.manifest:
+            from BatchResultsToTable import read_manifest
+
+            series_to_ingest += [(entry["series"], entry["sessions"]) for entry in read_manifest(args.manifest)]
+        if args.series:
+            series_to_ingest.append((args.series, args.sessions))
+
+        for series_directory, session_names in series_to_ingest:
+            start_time = time.perf_counter()
+            cache = None
+            if not args.no_cache:
+                cache = RaceReportCache(os.path.join(series_directory, RaceReportCache.default_cache_directory_name))
+            ingested_tracks, unchanged_tracks, failed_tracks = store.ingest_series(series_directory, session_names,
+                                                                                  read_laps=args.laps, cache=cache)
+            print("{}: {} rounds ingested, {} unchanged, {} failed in {:.2f}s".format(
+                series_directory, len(ingested_tracks), len(unchanged_tracks), len(failed_tracks),
+                time.perf_counter() - start_time))
+            for track, error in failed_tracks:
+                print("  {}: FAILED {}".format(track, error))
+
+        queries = []
+        if args.wins is not None:
+            queries.append(store.get_wins(args.wins or None, args.in_series))
+        if args.win_counts:
+            queries.append(store.get_win_counts(args.by, args.in_series))
+        if args.pole_counts:
+            queries.append(store.get_pole_counts(args.by, args.in_series))
+        if args.sql:
+            queries.append(store.query(args.sql))
+        for result in queries:
+            print(result.to_string(index=False))
+            print()
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    parsed_args = parse_args()
+    logging.basicConfig(level=logging.WARNING if parsed_args.quiet else logging.INFO, format="%(message)s")
+    run(parsed_args)
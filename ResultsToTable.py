@@ -1,14 +1,38 @@
 import argparse
+import cProfile
+import importlib
+import logging
+import os
+import time
+import traceback
 
-from Championship import Championship
-from DriversStandingsWriter import DriversStandingsWriter
-from ParticipationTableWriter import ParticipationTableWriter
-from RaceReportWriter import RaceReportWriter
-from SummaryTableWriter import SummaryTableWriter
-from TeamsStandingsWriter import TeamsStandingsWriter
+import FileUtils
+import Profiling
+from OutputManifest import OutputManifest
+from RaceReportCache import RaceReportCache
 
+logger = logging.getLogger(__name__)
 
-def parse_args():
+# Standings tables by the --only output name, as the module and class that writes them and the file they write
+# The championship and writer modules import pandas, so they're imported only once something has to be computed, runs
+# that only print help or whose outputs are all up to date never import them
+standings_writers = {"drivers": ("DriversStandingsWriter", "drivers_standings.txt"),
+                     "teams": ("TeamsStandingsWriter", "teams_standings.txt"),
+                     "summary": ("SummaryTableWriter", "summary_table.txt"),
+                     "participation": ("ParticipationTableWriter", "participation_table.txt")}
+race_report_file_name = "wiki_tables.txt"
+# Seconds a changed csv's modified time and size must stay the same in --watch mode before it is read
+watch_settle_time = 0.05
+outputs = list(standings_writers) + ["reports"]
+export_formats = ["parquet", "arrow", "json"]
+
+
+def get_standings_writer_class(output):
+    writer_name = standings_writers[output][0]
+    return getattr(importlib.import_module(writer_name), writer_name)
+
+
+def get_parser():
     parser = argparse.ArgumentParser(
         description="Read Simresults exported `.csv`s, calculate drivers' and teams' championship standings, and generate XWiki markdown text for championship standings tables and race reports. Please see README.md for complete usage.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -28,33 +52,345 @@ def parse_args():
                                help="How many driver contribute to the team score per round. (i.e. the top 'n' drivers' scores from every round will be added to the team total)")
     optional_args.add_argument("--write-race-reports", action="store_true",
                                help="Also write race report tables for each round in addition to series standings tables.")
+    optional_args.add_argument("--only", type=parse_outputs, metavar="OUTPUTS",
+                               help="Comma separated outputs to write out of {}, only the tables they need are computed. Every standings table, and race reports with --write-race-reports, are written when not given. (e.x. \"summary,participation\")".format(",".join(outputs)))
+    optional_args.add_argument("--export", nargs="+", choices=export_formats, default=[], metavar="FORMAT",
+                               help="Also export the computed standings, results and summary tables in these formats out of {}, parquet and arrow need pyarrow.".format(", ".join(export_formats)))
+    optional_args.add_argument("--export-directory", type=str,
+                               help='Directory to export tables to, an "export" directory in the series directory when not given.')
     optional_args.add_argument("--debug-csv-parse", action="store_true",
                                help="Print out the lines in the Simresults CSVs that are being read into dataframes. Use for debugging CSV manual adjustments.")
+    optional_args.add_argument("--jobs", type=int, default=1,
+                               help="Number of processes to read and clean the series' rounds with.")
+    optional_args.add_argument("--state-file", type=str,
+                               help="Save the computed championship to this file. Later runs with the same settings and unchanged inputs add only the new rounds to it instead of recomputing the season.")
+    optional_args.add_argument("--no-cache", action="store_true",
+                               help="Re-read and re-clean every round's CSV instead of reusing tables cached by previous runs.")
+    optional_args.add_argument("--clear-cache", action="store_true",
+                               help="Delete the series' cached round tables before running.")
+    optional_args.add_argument("--force", action="store_true",
+                               help="Write every output, even ones the series' output manifest shows were already written from the same inputs.")
+    optional_args.add_argument("--watch", action="store_true",
+                               help="Keep running after writing the tables, and regenerate them whenever a round's CSV is added or changed. New rounds are added to the championship as their CSVs appear.")
+    optional_args.add_argument("--watch-interval", type=float, default=0.2,
+                               help="Seconds between checks of the series directory for changed CSVs in --watch mode.")
+    optional_args.add_argument("--quiet", action="store_true",
+                               help="Only log warnings and errors, not progress.")
+    optional_args.add_argument("--verbose", action="store_true",
+                               help="Also log every table read, cleaned, cached and computed.")
+    optional_args.add_argument("--profile", action="store_true",
+                               help="Print a tree of how long each step of the run took.")
+    optional_args.add_argument("--profile-trace", type=str,
+                               help="Write the timed steps to this JSON file in Chrome trace format (open in chrome://tracing or Perfetto). Implies --profile.")
+    optional_args.add_argument("--profile-stats", type=str,
+                               help="Run under cProfile and write its stats to this file (read with pstats or snakeviz). Implies --profile.")
 
-    return parser.parse_args()
+    return parser
 
 
-def run(args):
-    championship = Championship(args.series, args.sessions, args.rounds_to_include, args.drop_week,
-                                args.num_scoring_drivers_in_team, args.debug_csv_parse)
-    driver_standings_writer = DriversStandingsWriter(championship)
-    driver_standings_writer.write_lines()
+def parse_args(args=None):
+    return get_parser().parse_args(args)
+
+
+def parse_outputs(text):
+    selected_outputs = [output.strip() for output in text.split(",") if output.strip()]
+    unknown_outputs = [output for output in selected_outputs if output not in outputs]
+    if unknown_outputs or not selected_outputs:
+        raise argparse.ArgumentTypeError("choose outputs from {}".format(",".join(outputs)))
+    return selected_outputs
+
+
+def get_outputs(args):
+    if args.only:
+        return args.only
+    return list(standings_writers) + (["reports"] if args.write_race_reports else [])
+
+
+def build_championship(args, cache, rounds_to_include):
+    from Championship import Championship
+
+    championship = None
+    # --debug-csv-parse prints the csv lines as rounds are read, so it reads every round instead of loading the state
+    if args.state_file and not args.debug_csv_parse:
+        championship = Championship.load_state(args.state_file, args.series, args.sessions, rounds_to_include,
+                                                args.drop_week, args.num_scoring_drivers_in_team, args.debug_csv_parse,
+                                                cache, args.jobs)
+    if championship is None:
+        championship = Championship(args.series, args.sessions, rounds_to_include, args.drop_week,
+                                    args.num_scoring_drivers_in_team, args.debug_csv_parse, cache, args.jobs)
+    return championship
+
+
+# Outputs the manifest shows are up to date are skipped unless force, so their tables are never computed
+def write_standings(championship, selected_outputs, manifest, force=False):
+    inputs_key = manifest.get_championship_inputs_key(championship)
+    for output in standings_writers:
+        if output in selected_outputs:
+            standings_writer = get_standings_writer_class(output)(championship)
+            if not force and manifest.is_up_to_date(standings_writer.output_file, inputs_key):
+                logger.info("table is up to date: %s", standings_writer.output_file)
+                continue
+            standings_writer.write_lines()
+            manifest.record(standings_writer.output_file, inputs_key)
+
+
+def write_race_reports(championship, races, manifest, force=False):
+    from RaceReportWriter import RaceReportWriter
+
+    for race in races:
+        if race in championship.race_reports:
+            race_report = championship.race_reports[race]
+            race_report_writer = RaceReportWriter(race_report, race_report_file_name)
+            inputs_key = manifest.get_race_report_inputs_key(race_report)
+            if not force and manifest.is_up_to_date(race_report_writer.output_file, inputs_key):
+                logger.info("race report is up to date: %s", race_report_writer.output_file)
+                continue
+            race_report_writer.write_generated_tables()
+            manifest.record(race_report_writer.output_file, inputs_key)
+
+
+# Exported tables are skipped like standings tables, a format is only exported again when one of its files isn't up to
+# date, they're also exported again when their schema version changes
+def write_exports(championship, args, manifest):
+    import TableExporter
+
+    export_directory = args.export_directory or os.path.join(args.series, "export")
+    inputs_key = OutputManifest.get_inputs_key([manifest.get_championship_inputs_key(championship),
+                                                TableExporter.schema_version])
+    table_exporter = TableExporter.TableExporter(championship)
+    for export_format in args.export:
+        output_files = TableExporter.get_output_files(export_directory, export_format).values()
+        if not args.force and all(manifest.is_up_to_date(output_file, inputs_key) for output_file in output_files):
+            logger.info("%s export is up to date: %s", export_format, export_directory)
+            continue
+        for output_file in table_exporter.export(export_directory, export_format).values():
+            manifest.record(output_file, inputs_key)
+
+
+# Whether the manifest shows every selected output is up to date, checked from the series' files alone so a run with
+# nothing to write finishes without building the championship or importing pandas
+def are_outputs_up_to_date(args, manifest, selected_outputs):
+    # exported tables are checked by write_exports, which needs the exporter and so pandas
+    if args.export or args.state_file and not os.path.isfile(args.state_file):
+        return False
+    rounds = FileUtils.read_tracks_rounds(args.series)
+    if not 0 < args.rounds_to_include <= len(rounds):
+        return False
+    included_rounds = rounds[0:args.rounds_to_include]
+
+    inputs_key = OutputManifest.get_standings_inputs_key(
+        args.series, args.sessions, args.rounds_to_include, args.drop_week, args.num_scoring_drivers_in_team,
+        [track for track, _ in included_rounds])
+    for output, (_, output_file_name) in standings_writers.items():
+        if output in selected_outputs and not manifest.is_up_to_date(os.path.join(args.series, output_file_name),
+                                                                     inputs_key):
+            return False
+
+    if "reports" in selected_outputs:
+        for track, csv_manual_adjustment in included_rounds:
+            race_path = os.path.join(args.series, track)
+            results_file = FileUtils.get_results_file(race_path) if os.path.isdir(race_path) else None
+            if results_file is None:
+                return False
+            inputs_key = OutputManifest.get_round_inputs_key(args.series, results_file, csv_manual_adjustment,
+                                                             args.sessions)
+            if not manifest.is_up_to_date(os.path.join(race_path, race_report_file_name), inputs_key):
+                return False
+    return True
+
 
-    teams_standings_writer = TeamsStandingsWriter(championship)
-    teams_standings_writer.write_lines()
+# Save the manifest and print the outputs whose contents changed since they were last written
+def finish_outputs(manifest):
+    manifest.save()
+    if manifest.changed_outputs:
+        print("changed outputs:")
+        for output_file in manifest.changed_outputs:
+            print("  {}".format(output_file))
+    else:
+        print("no outputs changed")
+    manifest.changed_outputs = []
 
-    summary_table_writer = SummaryTableWriter(championship)
-    summary_table_writer.write_lines()
 
-    participation_table_writer = ParticipationTableWriter(championship)
-    participation_table_writer.write_lines()
+# (modified time, size) of every csv in the series directory and its round directories, used to notice new/changed csvs
+def get_csvs_snapshot(series_directory):
+    snapshot = {}
+    directories = [series_directory] + [entry.path for entry in os.scandir(series_directory) if entry.is_dir()]
+    for directory in directories:
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith(".csv"):
+                stat = entry.stat()
+                snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+# (modified time, size) of each file, None for files that no longer exist
+def get_files_stats(files):
+    files_stats = {}
+    for file in files:
+        try:
+            stat = os.stat(file)
+            files_stats[file] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            files_stats[file] = None
+    return files_stats
+
+
+# Wait until the files' modified times and sizes stop changing, so csvs still being copied in are not read half written
+def wait_for_files_to_settle(files):
+    files_stats = get_files_stats(files)
+    while True:
+        time.sleep(watch_settle_time)
+        settled_files_stats = get_files_stats(files)
+        if settled_files_stats == files_stats:
+            return files_stats
+        files_stats = settled_files_stats
+
+
+# Bring a watched championship up to date with changed csvs and rewrite only the outputs they affect
+# Changed series tables or included rounds rebuild the championship (unchanged rounds come from the cache),
+# new rounds are added to the championship in memory
+# Only rounds in new_csv_directories, whose csvs appeared after the watch started, are added, rounds whose csvs were
+# already there stay excluded as --rounds-to-include asked
+def update_championship(args, championship, cache, manifest, changed_files, new_csv_directories):
+    changed_directories = {os.path.relpath(os.path.dirname(file), args.series) for file in changed_files}
+    included_tracks = list(championship.series_tracks_table.index[0:championship.rounds_to_include])
+
+    updated_races = []
+    if os.curdir in changed_directories:
+        logger.info("series tables changed, rebuilding championship")
+        championship = build_championship(args, cache, championship.rounds_to_include)
+        updated_races = list(championship.race_reports)
+    elif any(track in changed_directories for track in included_tracks):
+        updated_races = [track for track in included_tracks if track in changed_directories]
+        logger.info("included rounds changed, rebuilding championship: %s", updated_races)
+        championship = build_championship(args, cache, championship.rounds_to_include)
+
+    tracks = championship.series_tracks_table.index
+    while championship.rounds_to_include < len(tracks) and \
+            tracks[championship.rounds_to_include] in new_csv_directories:
+        updated_races.append(tracks[championship.rounds_to_include])
+        championship.add_round()
+
+    if not updated_races:
+        logger.info("no included or next rounds changed: %s", sorted(changed_directories))
+        return championship
+
+    selected_outputs = get_outputs(args)
+    write_standings(championship, selected_outputs, manifest, args.force)
+    if "reports" in selected_outputs:
+        write_race_reports(championship, updated_races, manifest, args.force)
+    write_exports(championship, args, manifest)
+    finish_outputs(manifest)
+    if args.state_file:
+        championship.save_state(args.state_file)
+    return championship
+
+
+# Poll the series directory for changed csvs until interrupted, only the changed csvs are checked again to make sure
+# they are fully written before they are read
+def watch(args, championship, cache, manifest):
+    logger.info("watching %s for changed csvs, press Ctrl+C to stop", args.series)
+    snapshot = get_csvs_snapshot(args.series)
+    watch_start_snapshot = snapshot
+    try:
+        while True:
+            time.sleep(args.watch_interval)
+            new_snapshot = get_csvs_snapshot(args.series)
+            if new_snapshot == snapshot:
+                continue
+
+            changed_files = [file for file in set(snapshot) | set(new_snapshot) if
+                             snapshot.get(file) != new_snapshot.get(file)]
+            for file, file_stats in wait_for_files_to_settle(changed_files).items():
+                if file_stats is None:
+                    new_snapshot.pop(file, None)
+                else:
+                    new_snapshot[file] = file_stats
+            snapshot = new_snapshot
+            new_csv_directories = {os.path.relpath(os.path.dirname(file), args.series) for file in snapshot if
+                                   file not in watch_start_snapshot}
+            update_start_time = time.perf_counter()
+            try:
+                championship = update_championship(args, championship, cache, manifest, changed_files,
+                                                   new_csv_directories)
+            except Exception:
+                # a bad csv shouldn't stop the watch, the tables are regenerated once it's fixed
+                traceback.print_exc()
+                continue
+            logger.info("updated tables in %.2fs", time.perf_counter() - update_start_time)
+    except KeyboardInterrupt:
+        logger.info("stopped watching %s", args.series)
+
+
+def configure_logging(args):
+    level = logging.INFO
+    if args.quiet:
+        level = logging.WARNING
+    elif args.verbose:
+        level = logging.DEBUG
+    logging.basicConfig(level=level, format="%(message)s")
+
+
+def generate_tables(args):
+    cache = RaceReportCache(os.path.join(args.series, RaceReportCache.default_cache_directory_name))
+    if args.clear_cache:
+        cache.clear()
+    if args.no_cache:
+        cache = None
+
+    if args.export:
+        import TableExporter
+
+        TableExporter.check_export_formats(args.export)
+
+    manifest = OutputManifest(args.series)
+    selected_outputs = get_outputs(args)
+    if not args.force and not args.watch and not args.debug_csv_parse and are_outputs_up_to_date(args, manifest,
+                                                                                                  selected_outputs):
+        logger.info("all outputs are up to date: %s", args.series)
+        finish_outputs(manifest)
+        return
+
+    championship = build_championship(args, cache, args.rounds_to_include)
+    write_standings(championship, selected_outputs, manifest, args.force)
+    if "reports" in selected_outputs:
+        write_race_reports(championship, championship.series_tracks_table.index, manifest, args.force)
+    write_exports(championship, args, manifest)
+    finish_outputs(manifest)
+    # saved after the outputs are written so the state also holds the tables they computed
+    if args.state_file:
+        championship.save_state(args.state_file)
+
+    if args.watch:
+        watch(args, championship, cache, manifest)
+
+
+def run(args):
+    profile = args.profile or args.profile_trace or args.profile_stats
+    if not profile:
+        generate_tables(args)
+        return
 
-    if args.write_race_reports:
-        for race in championship.series_tracks_table.index:
-            if race in championship.race_reports:
-                race_report_writer = RaceReportWriter(championship.race_reports[race])
-                race_report_writer.write_generated_tables()
+    Profiling.reset()
+    Profiling.enable()
+    profiler = cProfile.Profile() if args.profile_stats else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        with Profiling.span("run {}".format(args.series)):
+            generate_tables(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_stats)
+            logger.info("wrote cProfile stats: %s", args.profile_stats)
+        if args.profile_trace:
+            Profiling.write_trace(args.profile_trace)
+            logger.info("wrote profile trace: %s", args.profile_trace)
+        print(Profiling.format_tree())
 
 
 if __name__ == '__main__':
-    run(parse_args())
+    parsed_args = parse_args()
+    configure_logging(parsed_args)
+    run(parsed_args)
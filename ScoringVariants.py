@@ -0,0 +1,193 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import Profiling
+import Utils
+from Championship import Championship
+from RaceReportCache import RaceReportCache
+
+logger = logging.getLogger(__name__)
+
+
+class ScoringVariants:
+
+    # Final drivers' and teams' standings of a championship under many scoring tables at once, from the positions the
+    # championship already read, scoring_tables maps variant names to tables like Utils.read_scoring_table's
+    @Profiling.timed("scoring variants")
+    def __init__(self, championship, scoring_tables):
+        self.championship = championship
+        self.variants = list(scoring_tables)
+        assert len(self.variants) > 0, "no scoring tables given"
+
+        points_table = championship._all_drivers_points_table
+        self.participated = points_table.participated.any(axis=1)
+        self.drivers = points_table.index[self.participated]
+        self.countback_matrix = championship._all_drivers_countback_matrix[self.participated]
+
+        race_points, quali_points = self._get_variants_points(scoring_tables)
+        weekend_starts, self.weekends = points_table._get_weekends()
+        # variants x drivers x weekends
+        self.weekend_totals = np.add.reduceat(race_points + quali_points, weekend_starts, axis=2)
+
+        self._construct_drivers_totals()
+        self._construct_teams_totals()
+
+    # Points of every driver in every race for every variant, variants x drivers x races, from one gather of the
+    # positions matrices into a stack of points-by-position vectors (position 0 scores nothing)
+    def _get_variants_points(self, scoring_tables):
+        points_table = self.championship._all_drivers_points_table.take(self.participated)
+        positions = points_table.pos.astype(np.int64)
+        grids = points_table.quali_pos.astype(np.int64)
+        positions[positions < 0] = 0
+        grids[grids < 0] = 0
+
+        max_scoring_position = max(scoring_table.index.max() for scoring_table in scoring_tables.values())
+        num_positions = max(positions.max(initial=0), grids.max(initial=0), max_scoring_position) + 1
+        points_by_position = np.zeros((len(self.variants), num_positions), dtype=np.int64)
+        quali_points_by_position = np.zeros((len(self.variants), num_positions), dtype=np.int64)
+        for i, variant in enumerate(self.variants):
+            scoring_table = scoring_tables[variant]
+            scoring_positions = scoring_table.index.values
+            points_by_position[i, scoring_positions] = scoring_table["points"].values
+            quali_points_by_position[i, scoring_positions] = scoring_table["quali_points"].values
+
+        # quali points are only scored in races whose grid was set by a qualifying session
+        race_report = next(iter(self.championship.race_reports.values()))
+        sessions = points_table.columns.get_level_values(1)
+        grid_from_quali = np.array([race_report.race_session_grid_determined_by[session] in race_report.quali_sessions
+                                    for session in sessions])
+
+        race_points = points_by_position[:, positions]
+        quali_points = quali_points_by_position[:, grids] * grid_from_quali
+        return race_points, quali_points
+
+    def _construct_drivers_totals(self):
+        self.totals = self.weekend_totals.sum(axis=2)
+        self.totals_with_drop_week = self.totals - self.weekend_totals.min(axis=2)
+        standings_totals = self.totals_with_drop_week if self.championship.drop_week else self.totals
+
+        self.drivers_positions = np.empty(standings_totals.shape, dtype=np.int64)
+        for i in range(len(self.variants)):
+            standings_order = Utils.get_standings_order(standings_totals[i], self.countback_matrix, reverse_ties=True)
+            self.drivers_positions[i, standings_order] = np.arange(1, len(standings_order) + 1)
+
+    # Team scores per weekend are the sum of its top drivers' weekend totals, with drop weeks the drivers' drop week
+    # weekend is deleted before picking the top drivers
+    def _construct_teams_totals(self):
+        drivers_teams = self.championship.series_drivers_table.loc[self.drivers, "team"].values
+        # like the championship's groupby, drivers without a team or in no team don't score for teams
+        has_team = pd.notna(drivers_teams) & (drivers_teams != Utils.NO_TEAM)
+        self.teams = pd.Index(np.unique(drivers_teams[has_team]), name="team")
+
+        drop_weeks = self.weekend_totals.argmin(axis=2)
+        is_drop_week = drop_weeks[:, :, None] == np.arange(len(self.weekends))[None, None, :]
+        weekend_totals_with_drop_week_deleted = np.where(is_drop_week, 0, self.weekend_totals)
+
+        num_scoring_drivers = self.championship.num_scoring_drivers_in_team
+        teams_weekend_totals = np.zeros((len(self.variants), len(self.teams), len(self.weekends)), dtype=np.int64)
+        teams_weekend_totals_with_drop_week = np.zeros_like(teams_weekend_totals)
+        teams_countback_matrix = np.zeros((len(self.teams), self.countback_matrix.shape[1]), dtype=np.int64)
+        for i, team in enumerate(self.teams):
+            team_drivers = np.flatnonzero(drivers_teams == team)
+            teams_countback_matrix[i] = self.countback_matrix[team_drivers].sum(axis=0)
+            teams_weekend_totals[:, i] = np.sort(self.weekend_totals[:, team_drivers], axis=1)[
+                                         :, -num_scoring_drivers:].sum(axis=1)
+            teams_weekend_totals_with_drop_week[:, i] = np.sort(
+                weekend_totals_with_drop_week_deleted[:, team_drivers], axis=1)[:, -num_scoring_drivers:].sum(axis=1)
+
+        self.teams_totals = teams_weekend_totals.sum(axis=2)
+        self.teams_totals_with_drop_week = teams_weekend_totals_with_drop_week.sum(axis=2)
+        standings_totals = self.teams_totals_with_drop_week if self.championship.drop_week else self.teams_totals
+
+        self.teams_positions = np.empty(standings_totals.shape, dtype=np.int64)
+        for i in range(len(self.variants)):
+            standings_order = Utils.get_standings_order(standings_totals[i], teams_countback_matrix)
+            self.teams_positions[i, standings_order] = np.arange(1, len(standings_order) + 1)
+
+    # Comparison table of each variant's standings position and points for every row, sorted by the first variant
+    def _get_comparison_table(self, index, positions, totals):
+        comparison_table = pd.concat(
+            [pd.DataFrame(positions.T, index=index, columns=self.variants),
+             pd.DataFrame(totals.T, index=index, columns=self.variants)], axis=1, keys=["pos", "points"])
+        comparison_table = comparison_table.swaplevel(axis=1)[self.variants]
+        return comparison_table.iloc[np.argsort(positions[0])]
+
+    def get_drivers_comparison_table(self):
+        totals = self.totals_with_drop_week if self.championship.drop_week else self.totals
+        return self._get_comparison_table(self.drivers, self.drivers_positions, totals)
+
+    def get_teams_comparison_table(self):
+        totals = self.teams_totals_with_drop_week if self.championship.drop_week else self.teams_totals
+        return self._get_comparison_table(self.teams, self.teams_positions, totals)
+
+
+# Scoring tables from csv files and directories of csv files, named by file name
+def read_scoring_tables(paths):
+    scoring_tables = {}
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = [os.path.join(path, file) for file in sorted(os.listdir(path)) if file.endswith(".csv")]
+        for file in files:
+            scoring_tables[os.path.splitext(os.path.basename(file))[0]] = Utils.read_scoring_table_file(file)
+    return scoring_tables
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare a series' final drivers' and teams' standings under alternative points systems, all computed in one pass from the series' results.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required_args = parser.add_argument_group(title="Required Arguments")
+    required_args.add_argument("--series", required=True, type=str,
+                               help='Name of directory containing series data. (e.x. "simresults/MX5")')
+    required_args.add_argument("--sessions", required=True, nargs="+",
+                               help='List of names of session tables in results CSVs from this series. (e.x. "Qualify result" "Race 1 result" "Race 2 result")')
+    required_args.add_argument("--rounds-to-include", required=True, type=int,
+                               help="Number of series rounds that should be considered in points calculations.")
+    required_args.add_argument("--scoring-tables", required=True, nargs="+",
+                               help="Alternative points tables, as CSV files with the columns of points_table.csv or directories of them. The series' own points_table.csv is always compared first as 'current'.")
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--drop-week", action="store_true",
+                               help="Whether this series has a drop week that needs to factor into points calculations.")
+    optional_args.add_argument("--num-scoring-drivers-in-team", type=int, default=2,
+                               help="How many driver contribute to the team score per round.")
+    optional_args.add_argument("--no-cache", action="store_true",
+                               help="Re-read and re-clean every round's CSV instead of reusing tables cached by previous runs.")
+    optional_args.add_argument("--output-directory", type=str,
+                               help="Write the comparison tables to drivers_scoring_comparison.csv and teams_scoring_comparison.csv in this directory. (default: the series directory)")
+
+    return parser.parse_args()
+
+
+def run(args):
+    cache = None
+    if not args.no_cache:
+        cache = RaceReportCache(os.path.join(args.series, RaceReportCache.default_cache_directory_name))
+    championship = Championship(args.series, args.sessions, args.rounds_to_include, args.drop_week,
+                                args.num_scoring_drivers_in_team, cache=cache)
+
+    scoring_tables = {"current": championship.series_scoring_table}
+    scoring_tables.update(read_scoring_tables(args.scoring_tables))
+    scoring_variants = ScoringVariants(championship, scoring_tables)
+
+    output_directory = args.output_directory or args.series
+    os.makedirs(output_directory, exist_ok=True)
+    for name, comparison_table in [("drivers", scoring_variants.get_drivers_comparison_table()),
+                                   ("teams", scoring_variants.get_teams_comparison_table())]:
+        print(comparison_table.xs("pos", axis=1, level=1).to_string())
+        print()
+        output_file = os.path.join(output_directory, "{}_scoring_comparison.csv".format(name))
+        with Utils.open_atomic(output_file) as fp:
+            comparison_table.to_csv(fp)
+        logger.info("wrote table: %s", output_file)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run(parse_args())
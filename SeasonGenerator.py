@@ -0,0 +1,232 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+
+import Utils
+
+logger = logging.getLogger(__name__)
+
+
+class SeasonGenerator:
+    vehicle = "generated_car"
+    flag = "https://upload.wikimedia.org/wikipedia/commons/thumb/2/2f/Flag_of_the_United_Nations.svg/23px-Flag_of_the_United_Nations.svg.png"
+    base_lap_ms = 80000
+
+    session_block_line = "'+++++++++++++++++++++"
+    table_line = "'======================"
+    quali_header = "Pos,   Class, Team, Vehicle, Driver, Laps, Best lap, Gap"
+    quali_row = '"{pos}",   "", "", "{vehicle}", "{driver}", "{laps}", "{best_lap}", "{gap}",'
+    race_header = "Pos,    Class, Team, Vehicle, Driver, Laps, Time/Retired, Best lap, Consistency, Led, Pits,"
+    race_row = '"{pos}",  "", "", "{vehicle}", "{driver}", "{laps}", "{time_or_retired}", "{best_lap}", "{consistency}", "0", "{pits}", '
+    laps_header = "Lap, Vehicle, Pit, Pit time, Time, Sector 1, Sector 2, Sector 3,  Compound,     "
+    lap_row = '"{lap} ", {vehicle}, {pit},"{pit_time}", "{time}", "{sector_1}", "{sector_2}", "{sector_3}",  "F:H - R:H",     '
+    best_laps_header = "Driver, Vehicle, Time, Gap,"
+    best_laps_row = '"{driver}", "{vehicle}", "{time}", "{gap}"'
+
+    # Generator of a random series in Simresults format with num_races races per round after one qualifying session
+    # Every driver has a fixed pace so standings are realistic, a seed makes the same series every time
+    def __init__(self, num_drivers=20, num_rounds=8, num_races=2, num_laps=20, num_teams=None, participation=0.9,
+                 dnf_rate=0.05, seed=0):
+        assert num_drivers >= 3, "num_drivers must be at least 3"
+        self.num_drivers = num_drivers
+        self.num_rounds = num_rounds
+        self.num_races = num_races
+        self.num_laps = num_laps
+        self.num_teams = num_teams if num_teams is not None else max(num_drivers // 3, 1)
+        self.participation = participation
+        self.dnf_rate = dnf_rate
+        self.seed = seed
+
+        self.rng = np.random.default_rng(seed)
+        self.drivers = ["driver{:04d}".format(i + 1) for i in range(num_drivers)]
+        self.drivers_pace_ms = self.rng.normal(0, 800, num_drivers)
+        self.tracks = ["round_{:02d}".format(i + 1) for i in range(num_rounds)]
+        self.session_names = ["Qualify result"] + ["Race {} result".format(i + 1) for i in range(num_races)]
+
+    @staticmethod
+    def _format_time(ms):
+        minutes, ms = divmod(int(ms), 60000)
+        return "{:02d}:{:02d}.{:03d}0".format(minutes, ms // 1000, ms % 1000)
+
+    @staticmethod
+    def _format_seconds(ms):
+        return "{:.3f}0".format(int(ms) / 1000)
+
+    # Write drivers, points and tracks tables and one results csv per round to the series directory
+    def generate(self, series_directory):
+        os.makedirs(series_directory, exist_ok=True)
+        self._write_drivers_table(series_directory)
+        self._write_points_table(series_directory)
+        self._write_tracks_table(series_directory)
+        for i, track in enumerate(self.tracks):
+            race_directory = os.path.join(series_directory, track)
+            os.makedirs(race_directory, exist_ok=True)
+            results_file = os.path.join(race_directory, "gen{}-{:02d}.csv".format(self.seed, i + 1))
+            with Utils.open_atomic(results_file) as fp:
+                Utils.write_lines(fp, self._generate_round_lines(track))
+        logger.info("generated series: %s", series_directory)
+
+    def _write_drivers_table(self, series_directory):
+        lines = ["ign,name,number,team,flag"]
+        for i, driver in enumerate(self.drivers):
+            # every tenth driver is independent
+            team = "" if i % 10 == 9 else "Team {}".format(i % self.num_teams + 1)
+            lines.append("{},Driver {},{:03d},{},{}".format(driver, i + 1, i + 1, team, self.flag))
+        with Utils.open_atomic(os.path.join(series_directory, "drivers_table.csv")) as fp:
+            fp.write("\n".join(lines) + "\n")
+
+    def _write_points_table(self, series_directory):
+        num_scoring_positions = min(self.num_drivers, 15)
+        lines = ["pos,points,quali_points"]
+        for pos in range(1, num_scoring_positions + 1):
+            lines.append("{},{},{}".format(pos, 4 * (num_scoring_positions - pos + 1), max(4 - pos, 0)))
+        with Utils.open_atomic(os.path.join(series_directory, "points_table.csv")) as fp:
+            fp.write("\n".join(lines) + "\n")
+
+    def _write_tracks_table(self, series_directory):
+        lines = ["directory,abbrev,full_name,flag,csv_manual_adjustment"]
+        for i, track in enumerate(self.tracks):
+            lines.append("{},R{:02d},Round {},{},0".format(track, i + 1, i + 1, self.flag))
+        with Utils.open_atomic(os.path.join(series_directory, "tracks_table.csv")) as fp:
+            fp.write("\n".join(lines) + "\n")
+
+    # Lap times in ms of each driver for a session, drivers x laps
+    def _generate_lap_times(self, drivers, num_laps):
+        lap_times = self.base_lap_ms + self.drivers_pace_ms[drivers][:, None] + self.rng.gamma(2, 250, (
+            len(drivers), num_laps))
+        return lap_times.astype(np.int64)
+
+    def _generate_session_block(self, session, track, lasted_laps):
+        return [self.session_block_line, session, self.session_block_line, "",
+                'Game:, "Assetto Corsa"',
+                'Session:, "{}"'.format(session.split()[0]),
+                'Track:, "{}"'.format(track),
+                'Lasted laps, "{}"'.format(lasted_laps),
+                'Host, "Unknown"', "", ""]
+
+    # Laps and best laps sections of a session for drivers in finishing order
+    def _generate_laps_sections(self, session, drivers, lap_times, laps_completed):
+        lines = ["", "", "{} laps".format(session), self.table_line]
+        session_best_laps = []
+        for driver, driver_lap_times, num_laps in zip(drivers, lap_times, laps_completed):
+            lines += [self.laps_header, '"{}"'.format(self.drivers[driver])]
+            if num_laps == 0:
+                lines += ["No laps for this driver", ""]
+                continue
+            driver_lap_times = driver_lap_times[:num_laps]
+            sectors = np.stack([driver_lap_times * 38 // 100, driver_lap_times * 36 // 100], axis=1)
+            sectors = np.column_stack([sectors, driver_lap_times - sectors.sum(axis=1)])
+            pits = self.rng.random(num_laps) < 0.03
+            for lap in range(num_laps):
+                lines.append(self.lap_row.format(lap=lap + 1, vehicle=self.vehicle, pit="yes" if pits[lap] else "no",
+                                                 pit_time=int(pits[lap]) * 20, time=self._format_time(
+                        driver_lap_times[lap]), sector_1=self._format_seconds(sectors[lap, 0]),
+                                                 sector_2=self._format_seconds(sectors[lap, 1]),
+                                                 sector_3=self._format_seconds(sectors[lap, 2])))
+            average = [self._format_time(driver_lap_times.mean())] + [self._format_seconds(s) for s in
+                                                                      sectors.mean(axis=0)]
+            best = [self._format_time(sectors.min(axis=0).sum())] + [self._format_seconds(s) for s in
+                                                                     sectors.min(axis=0)]
+            lines.append('Average,,,"{}", "{}", "{}", "{}"'.format(*average))
+            lines.append('Best possible,,, "{}", "{}", "{}", "{}"'.format(*best))
+            lines.append("")
+            session_best_laps.append((driver_lap_times.min(), self.drivers[driver]))
+
+        session_best_laps.sort()
+        lines += ["", "{} best laps".format(session), self.table_line, self.best_laps_header]
+        for best_lap, driver in session_best_laps:
+            lines.append(self.best_laps_row.format(driver=driver, vehicle=self.vehicle,
+                                                   time=self._format_time(best_lap),
+                                                   gap=self._format_seconds(best_lap - session_best_laps[0][0])))
+        lines += ["", ""]
+        return lines
+
+    def _generate_quali_lines(self, track, drivers):
+        num_laps = max(self.num_laps // 2, 3)
+        lap_times = self._generate_lap_times(drivers, num_laps)
+        laps_completed = self.rng.integers(1, num_laps + 1, len(drivers))
+        # a few drivers join but never set a lap
+        laps_completed[self.rng.random(len(drivers)) < 0.03] = 0
+        best_laps = np.array([times[:laps].min() if laps else np.iinfo(np.int64).max for times, laps in
+                              zip(lap_times, laps_completed)])
+        order = np.argsort(best_laps, kind="stable")
+
+        lines = self._generate_session_block("Qualify", track, num_laps)
+        lines += ["Qualify result", self.table_line, self.quali_header]
+        for pos, i in enumerate(order):
+            set_lap = laps_completed[i] > 0
+            lines.append(self.quali_row.format(pos=pos + 1, vehicle=self.vehicle, driver=self.drivers[drivers[i]],
+                                               laps=laps_completed[i],
+                                               best_lap=self._format_time(best_laps[i]) if set_lap else "-",
+                                               gap="-" if pos == 0 or not set_lap else self._format_time(
+                                                   best_laps[i] - best_laps[order[0]])))
+        lines += self._generate_laps_sections("Qualify", drivers[order], lap_times[order], laps_completed[order])
+        return lines
+
+    def _generate_race_lines(self, track, session, drivers):
+        lap_times = self._generate_lap_times(drivers, self.num_laps)
+        laps_completed = np.full(len(drivers), self.num_laps)
+        dnfs = self.rng.random(len(drivers)) < self.dnf_rate
+        laps_completed[dnfs] = self.rng.integers(0, self.num_laps // 2 + 1, dnfs.sum())
+        race_times = np.array([times[:laps].sum() for times, laps in zip(lap_times, laps_completed)])
+        order = np.lexsort((race_times, -laps_completed))
+
+        lines = self._generate_session_block(session, track, self.num_laps)
+        lines += ["{} result".format(session), self.table_line, self.race_header]
+        for pos, i in enumerate(order):
+            laps = laps_completed[i]
+            if laps < self.num_laps:
+                time_or_retired = " DNF" if laps == 0 else " "
+            elif pos == 0:
+                time_or_retired = "    {}".format(self._format_time(race_times[i]))
+            else:
+                time_or_retired = "  '+{}".format(self._format_time(race_times[i] - race_times[order[0]]))
+            driver_lap_times = lap_times[i, :laps]
+            consistency = "{:.2f}%".format(100 * driver_lap_times.min() / driver_lap_times.mean()) if laps > 1 else "-"
+            lines.append(self.race_row.format(pos=pos + 1, vehicle=self.vehicle, driver=self.drivers[drivers[i]],
+                                              laps=laps, time_or_retired=time_or_retired,
+                                              best_lap=self._format_time(driver_lap_times.min()) if laps else "-",
+                                              consistency=consistency, pits=0))
+        lines += self._generate_laps_sections(session, drivers[order], lap_times[order], laps_completed[order])
+        return lines
+
+    # Lines of a round's results csv, each session is entered by a random subset of the drivers
+    def _generate_round_lines(self, track):
+        drivers = np.flatnonzero(self.rng.random(self.num_drivers) < self.participation)
+        if len(drivers) < 3:
+            drivers = np.arange(3)
+
+        lines = self._generate_quali_lines(track, drivers)
+        for race in range(self.num_races):
+            lines += self._generate_race_lines(track, "Race {}".format(race + 1), drivers)
+        return lines
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate a random series of Simresults-format CSVs and series tables, for testing and benchmarking at sizes beyond the real series.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required_args = parser.add_argument_group(title="Required Arguments")
+    required_args.add_argument("--series", required=True, type=str,
+                               help='Directory to write the generated series to. (e.x. "simresults/GEN")')
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--drivers", type=int, default=20, help="Number of drivers in the series.")
+    optional_args.add_argument("--rounds", type=int, default=8, help="Number of rounds in the series.")
+    optional_args.add_argument("--races", type=int, default=2, help="Number of races per round after qualifying.")
+    optional_args.add_argument("--laps", type=int, default=20, help="Number of laps per race.")
+    optional_args.add_argument("--teams", type=int, help="Number of teams. (default: a third of the drivers)")
+    optional_args.add_argument("--seed", type=int, default=0, help="Random seed, the same seed generates the same series.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_args()
+    generator = SeasonGenerator(args.drivers, args.rounds, args.races, args.laps, args.teams, seed=args.seed)
+    generator.generate(args.series)
+    print("sessions:", " ".join('"{}"'.format(name) for name in generator.session_names))
@@ -0,0 +1,187 @@
+import bisect
+import csv
+import io
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+class SimresultsFile:
+
+    # Read a Simresults exported csv into memory once and index where every section of it starts and ends
+    # Sections are found from the blank lines between them, lines and csv records are only walked where tables are read
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+        with open(self.file_path) as fp:
+            self.buffer = fp.read()
+
+        self.num_lines = self.buffer.count("\n") + (len(self.buffer) > 0 and not self.buffer.endswith("\n"))
+        self.sections = self._index_sections()
+        self._section_lines = [section[1] for section in self.sections]
+
+        # line each csv record starts on, tokenised from the start of the file only as far as adjusted tables need
+        self._record_lines = []
+        self._records_reader = None
+
+    # Sections are blocks of lines separated by blank lines, titled by their first line (e.x. "Race 1 result", "Race 1 laps")
+    # Result is a list of [title, title line number, line number of the blank line ending the section, offset of the
+    # title line] in file order
+    def _index_sections(self):
+        buffer = self.buffer
+        sections = []
+        offset = 0
+        line_number = 0
+        while offset < len(buffer):
+            if buffer[offset] == "\n":
+                offset += 1
+                line_number += 1
+                continue
+            title_end = buffer.find("\n", offset)
+            blank_line = buffer.find("\n\n", offset)
+            if blank_line == -1:
+                title = buffer[offset:title_end if title_end != -1 else len(buffer)]
+                sections.append([title, line_number, self.num_lines, offset])
+                break
+            end_line = line_number + buffer.count("\n", offset, blank_line + 1)
+            sections.append([buffer[offset:title_end], line_number, end_line, offset])
+            offset = blank_line + 2
+            line_number = end_line + 1
+        return sections
+
+    # Offset into the buffer of the start of a line, found from the closest section title before it
+    def _get_line_offset(self, line_number):
+        if line_number >= self.num_lines:
+            return len(self.buffer)
+        section_index = bisect.bisect_right(self._section_lines, line_number) - 1
+        offset, from_line = (self.sections[section_index][3], self.sections[section_index][1]) if \
+            section_index >= 0 else (0, 0)
+        for _ in range(line_number - from_line):
+            offset = self.buffer.find("\n", offset) + 1
+        return offset
+
+    # Lines [start_line, end_line) of the file one at a time, to the end of the file without an end_line
+    def _iter_lines(self, start_line, end_line=None):
+        end_line = self.num_lines if end_line is None else min(end_line, self.num_lines)
+        offset = self._get_line_offset(start_line)
+        for _ in range(start_line, end_line):
+            line_end = self.buffer.find("\n", offset)
+            next_offset = len(self.buffer) if line_end == -1 else line_end + 1
+            yield self.buffer[offset:next_offset]
+            offset = next_offset
+
+    def get_line(self, line_number):
+        return next(self._iter_lines(line_number, line_number + 1), "")
+
+    # Text of lines [start_line, end_line) of the file
+    def get_lines(self, start_line, end_line):
+        return self.buffer[self._get_line_offset(start_line):self._get_line_offset(end_line)]
+
+    # Line a csv record starts on, or the end of the file past the last record
+    # Stray quotes in Simresults csvs can make a record span several lines, csv_manual_adjustment counts records not lines
+    # so records are tokenised from the start of the file, only as far as the records asked for
+    def _get_record_line(self, record):
+        if self._records_reader is None:
+            self._records_reader = csv.reader(self._iter_lines(0), skipinitialspace=True)
+            self._record_lines.append(0)
+        while len(self._record_lines) <= record and self._record_lines[-1] < self.num_lines:
+            next(self._records_reader)
+            self._record_lines.append(self._records_reader.line_num)
+        return self._record_lines[record] if record < len(self._record_lines) else self.num_lines
+
+    # Find the section for a session table, the last section with a title starting with the name is used
+    def find_section(self, name):
+        found_section = None
+        for section in self.sections:
+            if section[0].startswith(name):
+                found_section = section
+        assert found_section is not None, "could not find table '{}' in {}".format(name, self.file_path)
+        return found_section
+
+    # Text of a session table, the csv header is 2 records below the section title (under the '==== line)
+    # csv_manual_adjustment shifts the table up/down by records for csvs that are malformed, without one the records are
+    # the section's lines and none are tokenised
+    def get_table_text(self, name, csv_manual_adjustment=0):
+        _, title_line, end_line, _ = self.find_section(name)
+        get_record_line = self._get_record_line if csv_manual_adjustment else lambda record: min(record, self.num_lines)
+
+        header_record = max(title_line + 2 + csv_manual_adjustment, 0)
+        end_record = header_record + 1
+        num_rows = 0
+        while num_rows < end_line - title_line - 3 and get_record_line(end_record) < self.num_lines:
+            if self.get_line(get_record_line(end_record)) != "\n":
+                num_rows += 1
+            end_record += 1
+
+        return self.get_lines(get_record_line(header_record), get_record_line(end_record))
+
+    # Parse a session table from the in-memory buffer to a dataframe of strings
+    def read_table(self, name, csv_manual_adjustment=0):
+        table_text = self.get_table_text(name, csv_manual_adjustment)
+        return pd.read_csv(io.StringIO(table_text), index_col=False, skipinitialspace=True, quotechar='"',
+                           dtype=object)
+
+    # Milliseconds of a Simresults time (e.x. "01:17.7580", "42.2490", "1:02:03.1000"), -1 if there is no time ("-")
+    @staticmethod
+    def parse_time_ms(text):
+        parts = text.strip().split(":")
+        try:
+            time_ms = round(float(parts[-1]) * 1000)
+            for i, part in enumerate(reversed(parts[:-1])):
+                time_ms += int(part) * 60000 * 60 ** i
+        except ValueError:
+            return -1
+        return time_ms
+
+    # Lines of a session's laps section (e.x. "Race 1 laps"), which is split by blank lines into one block per driver
+    def _iter_laps_lines(self, name):
+        section = self.find_section(name)
+        section_index = self.sections.index(section)
+        yield from self._iter_lines(section[1] + 2, section[2])
+        for title, title_line, end_line, _ in self.sections[section_index + 1:]:
+            if not title.startswith("Lap,"):
+                break
+            yield from self._iter_lines(title_line, end_line)
+
+    # Parse a session's laps section to a compact columnar table of driver, lap number, lap and sector times as integer
+    # milliseconds (-1 when missing) and pit flag, streamed line by line into typed arrays so no row objects are kept
+    def read_laps(self, name):
+        drivers = {}
+        driver_codes = array("h")
+        lap_numbers = array("h")
+        times_ms = array("i")
+        sectors_ms = []
+        pits = array("b")
+
+        columns = None
+        sector_columns = []
+        driver_code = -1
+        for record in csv.reader(self._iter_laps_lines(name), skipinitialspace=True):
+            if not record:
+                continue
+            first_field = record[0].strip()
+            if first_field == "Lap":
+                columns = {column.strip(): i for i, column in enumerate(record)}
+                sector_columns = sorted(column for column in columns if column.startswith("Sector "))
+                while len(sectors_ms) < len(sector_columns):
+                    sectors_ms.append(array("i", [-1]) * len(times_ms))
+            elif len(record) == 1 and first_field != "No laps for this driver":
+                driver_code = drivers.setdefault(first_field, len(drivers))
+            elif first_field.isdigit() and columns is not None:
+                driver_codes.append(driver_code)
+                lap_numbers.append(int(first_field))
+                times_ms.append(self.parse_time_ms(record[columns["Time"]]))
+                pits.append(record[columns["Pit"]].strip().lower() == "yes")
+                for i, sector_ms in enumerate(sectors_ms):
+                    sector_ms.append(self.parse_time_ms(record[columns[sector_columns[i]]]) if i < len(
+                        sector_columns) else -1)
+
+        laps = {"driver": pd.Categorical.from_codes(np.frombuffer(driver_codes, dtype=np.int16),
+                                                    categories=list(drivers)),
+                "lap": np.frombuffer(lap_numbers, dtype=np.int16),
+                "time_ms": np.frombuffer(times_ms, dtype=np.int32)}
+        for i, sector_ms in enumerate(sectors_ms):
+            laps["sector_{}_ms".format(i + 1)] = np.frombuffer(sector_ms, dtype=np.int32)
+        laps["pit"] = np.frombuffer(pits, dtype=np.int8).astype(bool)
+        return pd.DataFrame(laps)
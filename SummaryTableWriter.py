@@ -1,3 +1,5 @@
+import functools
+
 from Championship import Championship
 from TableWriter import TableWriter
 
@@ -33,6 +35,11 @@ class SummaryTableWriter(TableWriter):
     def __init__(self, championship, output_file_name="summary_table.txt"):
         super().__init__(championship, output_file_name)
 
+    # Summary rows by (track, session), read when the rows are generated so a skipped writer never builds the summary
+    @functools.cached_property
+    def summary_rows(self):
+        return self.championship.summary_table.to_dict("index")
+
     def _generate_table_header(self):
         header_0 = self.header_0_format.format(table_width=self.table_width)
 
@@ -45,7 +52,7 @@ class SummaryTableWriter(TableWriter):
         return lines_buffer
 
     def _generate_summary_row_drivers_and_team(self, track, session):
-        summary_table_row = self.championship.summary_table.loc[(track, session)]
+        summary_table_row = self.summary_rows[(track, session)]
 
         pole_driver = summary_table_row["pole"]
         pole_driver_driver_flag_and_name = self.empty_cell_format.format(width=self.pole_width)
@@ -67,8 +74,6 @@ class SummaryTableWriter(TableWriter):
         return "".join(session_row_substrings)
 
     def _generate_table_rows(self):
-        lines_buffer = []
-
         for i, track in enumerate(self.championship.series_tracks_table.index):
 
             round_number = i + 1
@@ -81,7 +86,7 @@ class SummaryTableWriter(TableWriter):
             row_round_race = self.row_round_race_format.format(round_race_width=self.round_race_width,
                                                                session_abbrev=session_abbrev)
 
-            track_info = self.championship.series_tracks_table.loc[track]
+            track_info = self.render_cache.track_infos[track]
             row_circuit = self.row_circuit_format.format(num_race_sessions=self.num_race_sessions,
                                                          circuit_width=self.circuit_width,
                                                          track_flag=track_info["flag"],
@@ -91,7 +96,7 @@ class SummaryTableWriter(TableWriter):
                                                                       width=self.link_width)
             row_session_drivers_and_team = self.row_session_drivers_and_team_empty
             if i < self.championship.rounds_to_include:
-                results_link = self.championship.summary_table.loc[(track, first_session), "link"]
+                results_link = self.summary_rows[(track, first_session)]["link"]
                 row_results_link = self.row_results_link_format.format(num_race_sessions=self.num_race_sessions,
                                                                        link_width=self.link_width, link=results_link)
                 row_session_drivers_and_team = self._generate_summary_row_drivers_and_team(track, first_session)
@@ -100,7 +105,7 @@ class SummaryTableWriter(TableWriter):
                                       row_results_link]
             summary_row = "".join(summary_row_substrings)
 
-            lines_buffer.append(summary_row)
+            yield summary_row
 
             for session in self.championship.series_race_sessions[1:]:
                 session_abbrev = self._get_race_session_abbrev(session)
@@ -113,9 +118,7 @@ class SummaryTableWriter(TableWriter):
 
                 substrings = [round_race, row_session_drivers_and_team]
                 row = "".join(substrings)
-                lines_buffer.append(row)
-
-        return lines_buffer
+                yield row
 
 
 if __name__ == "__main__":
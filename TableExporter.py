@@ -0,0 +1,205 @@
+import functools
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import Profiling
+import Utils
+
+logger = logging.getLogger(__name__)
+
+# Bump when a table's columns or their meaning change, it's saved with every exported table
+schema_version = 1
+
+# File extension of each export format, parquet and arrow (Arrow IPC files, uncompressed so they can be memory-mapped)
+# need pyarrow, json doesn't
+export_formats = {"parquet": ".parquet", "arrow": ".arrow", "json": ".json"}
+
+# Columns and types of the exported tables, tables by round or session have a row per driver and round or session
+# instead of a column per round, so their columns are the same however many rounds are included
+table_schemas = {
+    "drivers_totals": {"position": "int16", "driver": "string", "team": "string", "total": "int64",
+                       "total_with_drop_week": "int64", "drop_week": "string"},
+    "drivers_weekends": {"driver": "string", "round": "int16", "track": "string", "points": "int64",
+                         "participated": "bool", "dropped": "bool"},
+    "drivers_points": {"driver": "string", "round": "int16", "track": "string", "session": "string", "pos": "int16",
+                       "points": "int16", "quali_pos": "int16", "quali_points": "int16", "dnf": "bool",
+                       "participated": "bool"},
+    "teams_totals": {"position": "int16", "team": "string", "total": "int64", "total_with_drop_week": "int64"},
+    "teams_drivers": {"team": "string", "driver": "string"},
+    "summary": {"round": "int16", "track": "string", "session": "string", "link": "string", "pole": "string",
+                "fastest": "string", "winner": "string", "team": "string"},
+}
+
+
+class TableExporter:
+
+    # Championship tables as typed columnar tables with the columns in table_schemas, results that are kept as objects
+    # or strings for the wiki tables are split into a typed column per attribute
+    def __init__(self, championship):
+        self.championship = championship
+        tracks = championship.series_tracks_table.index
+        self._rounds = pd.Series(np.arange(1, len(tracks) + 1), index=tracks)
+
+    # Position in the series of each track, from 1
+    def _get_rounds(self, tracks):
+        return self._rounds.loc[tracks].values
+
+    def _get_drivers_teams(self, drivers):
+        return self.championship.series_drivers_table["team"].reindex(drivers).values
+
+    @Profiling.timed("export drivers totals")
+    def get_drivers_totals(self):
+        drivers_totals_table = self.championship.drivers_totals_table
+        drop_weeks = drivers_totals_table["drop_week"].values if self.championship.drop_week else None
+        return _apply_schema("drivers_totals", pd.DataFrame({
+            "position": np.arange(1, len(drivers_totals_table) + 1),
+            "driver": drivers_totals_table.index,
+            "team": self._get_drivers_teams(drivers_totals_table.index),
+            "total": drivers_totals_table["total"].values,
+            "total_with_drop_week": drivers_totals_table["total_with_drop_week"].values,
+            "drop_week": drop_weeks}))
+
+    @Profiling.timed("export drivers weekends")
+    def get_drivers_weekends(self):
+        drivers_totals_table = self.championship.drivers_totals_table
+        drivers = drivers_totals_table.index
+        tracks = drivers_totals_table.columns[0:drivers_totals_table.columns.get_loc("drop_week")]
+        participation = self.championship.drivers_participation_table.reindex(drivers)[tracks].values
+        dropped = np.zeros(participation.shape, dtype=bool)
+        if self.championship.drop_week:
+            dropped = drivers_totals_table["drop_week"].values.reshape(-1, 1) == np.array(tracks).reshape(1, -1)
+        return _apply_schema("drivers_weekends", pd.DataFrame({
+            "driver": np.repeat(drivers.values, len(tracks)),
+            "round": np.tile(self._get_rounds(tracks), len(drivers)),
+            "track": np.tile(tracks.values, len(drivers)),
+            "points": drivers_totals_table[tracks].values.ravel(),
+            "participated": participation.ravel(),
+            "dropped": dropped.ravel()}))
+
+    @Profiling.timed("export drivers points")
+    def get_drivers_points(self):
+        drivers_points_table = self.championship.drivers_points_table
+        drivers = drivers_points_table.index
+        tracks = drivers_points_table.columns.get_level_values("track")
+        sessions = drivers_points_table.columns.get_level_values("session")
+        return _apply_schema("drivers_points", pd.DataFrame({
+            "driver": np.repeat(drivers.values, len(tracks)),
+            "round": np.tile(self._get_rounds(tracks), len(drivers)),
+            "track": np.tile(tracks.values, len(drivers)),
+            "session": np.tile(sessions.values, len(drivers)),
+            "pos": drivers_points_table.pos.ravel(),
+            "points": drivers_points_table.points.ravel(),
+            "quali_pos": drivers_points_table.quali_pos.ravel(),
+            "quali_points": drivers_points_table.quali_points.ravel(),
+            "dnf": drivers_points_table.dnf.ravel(),
+            "participated": drivers_points_table.participated.ravel()}))
+
+    @Profiling.timed("export teams totals")
+    def get_teams_totals(self):
+        teams_totals_table = self.championship.teams_totals_table
+        return _apply_schema("teams_totals", pd.DataFrame({
+            "position": np.arange(1, len(teams_totals_table) + 1),
+            "team": teams_totals_table.index,
+            "total": teams_totals_table["total"].values,
+            "total_with_drop_week": teams_totals_table["total_with_drop_week"].values}))
+
+    @Profiling.timed("export teams drivers")
+    def get_teams_drivers(self):
+        drivers_lists = self.championship.teams_and_drivers_table["drivers_list"]
+        return _apply_schema("teams_drivers", pd.DataFrame({
+            "team": np.repeat(drivers_lists.index.values, drivers_lists.str.len().values).astype(object),
+            "driver": [driver for drivers_list in drivers_lists for driver in drivers_list]}))
+
+    @Profiling.timed("export summary")
+    def get_summary(self):
+        summary_table = self.championship.summary_table.reset_index()
+        summary_table.insert(0, "round", self._get_rounds(summary_table["track"]))
+        return _apply_schema("summary", summary_table)
+
+    # Every exported table by name, built once for all the formats they're exported in
+    @functools.cached_property
+    def tables(self):
+        return {name: getattr(self, "get_{}".format(name))() for name in table_schemas}
+
+    # Write every table to a file named after it in export_directory, files whose contents are unchanged are left as
+    # they are, returns the files by table name
+    @Profiling.timed("export tables")
+    def export(self, export_directory, export_format):
+        output_files = get_output_files(export_directory, export_format)
+        write_table = {"parquet": _write_parquet, "arrow": _write_arrow, "json": _write_json}[export_format]
+        os.makedirs(export_directory, exist_ok=True)
+        for name, table in self.tables.items():
+            with Utils.open_atomic(output_files[name], "wb", keep_unchanged=True) as fp:
+                write_table(fp, name, table)
+            logger.info("exported table: %s", output_files[name])
+        return output_files
+
+
+# File each table is exported to in a format, by table name
+def get_output_files(export_directory, export_format):
+    assert export_format in export_formats, "export format must be one of {}: {}".format(
+        ", ".join(export_formats), export_format)
+    return {name: os.path.join(export_directory, "{}{}".format(name, export_formats[export_format])) for name in
+            table_schemas}
+
+
+# Table columns in schema order and types, missing strings are left as missing values
+def _apply_schema(name, table):
+    schema = table_schemas[name]
+    return table[list(schema)].astype(schema).reset_index(drop=True)
+
+
+# Fail before anything is computed when a format is unknown or needs pyarrow and it isn't installed
+def check_export_formats(formats):
+    for export_format in formats:
+        assert export_format in export_formats, "export format must be one of {}: {}".format(
+            ", ".join(export_formats), export_format)
+        if export_format != "json":
+            _import_pyarrow()
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("parquet and arrow exports need pyarrow, install it with: pip install pyarrow") from None
+    return pyarrow
+
+
+# Arrow table with the table's schema types, its metadata is only the table name and schema version so the same table
+# always makes the same file
+def _to_arrow_table(pyarrow, name, table):
+    arrow_types = {"int16": pyarrow.int16(), "int64": pyarrow.int64(), "bool": pyarrow.bool_(),
+                   "string": pyarrow.string()}
+    arrow_schema = pyarrow.schema([(column, arrow_types[column_type]) for column, column_type in
+                                   table_schemas[name].items()])
+    arrow_table = pyarrow.Table.from_pandas(table, schema=arrow_schema, preserve_index=False)
+    return arrow_table.replace_schema_metadata({"table": name, "schema_version": str(schema_version)})
+
+
+def _write_parquet(fp, name, table):
+    pyarrow = _import_pyarrow()
+    import pyarrow.parquet
+
+    pyarrow.parquet.write_table(_to_arrow_table(pyarrow, name, table), fp)
+
+
+def _write_arrow(fp, name, table):
+    pyarrow = _import_pyarrow()
+    import pyarrow.ipc
+
+    arrow_table = _to_arrow_table(pyarrow, name, table)
+    with pyarrow.ipc.new_file(fp, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+
+
+# Columns as lists of values by column name, with the table name, schema version and column types
+def _write_json(fp, name, table):
+    columns = {column: table[column].astype(object).where(table[column].notna(), None).tolist() for column in
+               table.columns}
+    fp.write(json.dumps({"table": name, "schema_version": schema_version, "schema": table_schemas[name],
+                         "columns": columns}).encode())
@@ -1,6 +1,36 @@
+import logging
 import os
 import re
 import textwrap
+import weakref
+
+import Profiling
+import Utils
+
+logger = logging.getLogger(__name__)
+
+
+# Cell fragments shared by every writer of a championship, each driver and track cell is rendered once per width and
+# each result cell once per distinct result, so rows are joined from plain dict lookups instead of pandas lookups
+class TableRenderCache:
+
+    def __init__(self, championship):
+        drivers_table = championship.series_drivers_table
+        self.driver_numbers = dict(zip(drivers_table.index, drivers_table["number"]))
+        self.driver_flags_and_names = dict(zip(drivers_table.index, zip(drivers_table["flag"], drivers_table["name"])))
+        self.track_infos = championship.series_tracks_table.to_dict("index")
+
+        self.driver_flag_and_name_cells = {}
+        self.result_cells = {}
+
+    # Render caches by championship, dropped with the championship so a rebuilt championship gets a fresh one
+    _render_caches = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def get(championship):
+        if championship not in TableRenderCache._render_caches:
+            TableRenderCache._render_caches[championship] = TableRenderCache(championship)
+        return TableRenderCache._render_caches[championship]
 
 
 class TableWriter:
@@ -36,13 +66,15 @@ class TableWriter:
         self.output_file_name = output_file_name
         self.output_file = os.path.join(championship.series, output_file_name)
 
+        self.render_cache = TableRenderCache.get(championship)
+
         self.num_race_sessions = len(self.championship.series_race_sessions)
         self.track_width = self.num_race_sessions * self.result_width
 
     def _generate_header_1_tracks_list(self):
         header_1_tracks_list = []
         for track in self.championship.series_tracks_table.index:
-            track_info = self.championship.series_tracks_table.loc[track]
+            track_info = self.render_cache.track_infos[track]
             track_abbrev = track_info["abbrev"]
             if track in self.championship.race_reports:
                 track_abbrev = "[[{}>>{}]]".format(track_abbrev, self.championship.race_reports[track].simresults_url)
@@ -70,62 +102,81 @@ class TableWriter:
         return "".join(header_2_sessions_list)
 
     def _generate_driver_flag_and_name(self, driver, width):
-        driver_info = self.championship.series_drivers_table.loc[driver]
-        driver_flag = driver_info["flag"]
-        driver_full_name = driver_info["name"]
-        return self.row_driver_flag_and_name_format.format(width=width, driver_flag=driver_flag,
-                                                           driver=driver_full_name)
+        key = (driver, width)
+        driver_flag_and_name = self.render_cache.driver_flag_and_name_cells.get(key)
+        if driver_flag_and_name is None:
+            driver_flag, driver_full_name = self.render_cache.driver_flags_and_names[driver]
+            driver_flag_and_name = self.row_driver_flag_and_name_format.format(width=width, driver_flag=driver_flag,
+                                                                               driver=driver_full_name)
+            self.render_cache.driver_flag_and_name_cells[key] = driver_flag_and_name
+        return driver_flag_and_name
+
+    # Result cell for a (pos, scored points, dnf, quali pos if scored quali points) result, None is an empty cell for
+    # races not run yet or not participated in
+    def _generate_standing_row_result(self, result):
+        key = (self.result_width, result)
+        driver_row_result = self.render_cache.result_cells.get(key)
+        if driver_row_result is not None:
+            return driver_row_result
+
+        result_string = ""
+        result_color = self.result_color_default
+
+        if result is not None:
+            pos, scored_points, dnf, scored_quali_pos = result
+            result_color = self.result_color_no_points
+            result_string = str(pos)
+            if scored_points:
+                result_color = self.result_color_points
+            if pos <= 3:
+                result_color = self.result_color_top_3[pos - 1]
+            if dnf:
+                result_string = "RET"
+                result_color = self.result_color_ret
+            if scored_quali_pos is not None:
+                result_string = "{}^^{}^^".format(result_string, scored_quali_pos)
+
+        driver_row_result = self.standing_row_result_format.format(result_color=result_color,
+                                                                   result_width=self.result_width,
+                                                                   result=result_string)
+        self.render_cache.result_cells[key] = driver_row_result
+        return driver_row_result
 
     def _generate_standing_row_results_list(self, driver):
+        drivers_points_table = self.championship.drivers_points_table
+
+        row = drivers_points_table.index.get_loc(driver)
+        driver_results = zip(drivers_points_table.pos[row].tolist(), drivers_points_table.points[row].tolist(),
+                             drivers_points_table.quali_pos[row].tolist(),
+                             drivers_points_table.quali_points[row].tolist(), drivers_points_table.dnf[row].tolist())
+
         row_results_substrings = []
-        for i in range(self.championship.num_total_races):
-
-            result_string = ""
-            result_color = self.result_color_default
-
-            if i >= len(self.championship.drivers_points_table.columns):
-                driver_row_result = self.standing_row_result_format.format(result_color=result_color,
-                                                                           result_width=self.result_width,
-                                                                           result=result_string)
-                row_results_substrings.append(driver_row_result)
-                continue
-
-            result_info = self.championship.drivers_points_table.loc[
-                driver, self.championship.drivers_points_table.columns[i]]
-
-            if result_info.pos > 0:
-                result_color = self.result_color_no_points
-                result_string = str(result_info.pos)
-                if result_info.points > 0:
-                    result_color = self.result_color_points
-                if result_info.pos <= 3:
-                    result_color = self.result_color_top_3[result_info.pos - 1]
-                if result_info.dnf:
-                    result_string = "RET"
-                    result_color = self.result_color_ret
-                if result_info.quali_points > 0:
-                    result_string = "{}^^{}^^".format(result_string, result_info.quali_pos)
-
-            driver_row_result = self.standing_row_result_format.format(result_color=result_color,
-                                                                       result_width=self.result_width,
-                                                                       result=result_string)
-            row_results_substrings.append(driver_row_result)
+        for pos, points, quali_pos, quali_points, dnf in driver_results:
+            result = None
+            if pos > 0:
+                result = (pos, points > 0, dnf, quali_pos if quali_points > 0 else None)
+            row_results_substrings.append(self._generate_standing_row_result(result))
+
+        num_races_not_run = self.championship.num_total_races - len(row_results_substrings)
+        row_results_substrings.extend([self._generate_standing_row_result(None)] * num_races_not_run)
         return "".join(row_results_substrings)
 
     def _generate_table_header(self):
         raise NotImplementedError
 
+    # Generator of the table's row lines
     def _generate_table_rows(self):
         raise NotImplementedError
 
     def _generate_lines(self):
-        return self._generate_table_header() + self._generate_table_rows()
+        yield from self._generate_table_header()
+        yield from self._generate_table_rows()
 
+    # Lines are streamed to the output file as they are generated, optionally provide the lines to write instead
     def write_lines(self, lines_buffer=None):
         if not lines_buffer:
             lines_buffer = self._generate_lines()
 
-        with open(self.output_file, "w+") as fp:
-            table_string = "\n".join(lines_buffer) + "\n\n"
-            fp.write(table_string)
-            print("wrote table:", self.output_file)
+        with Profiling.span(type(self).__name__), Utils.open_atomic(self.output_file, keep_unchanged=True) as fp:
+            Utils.write_lines(fp, lines_buffer)
+        logger.info("wrote table: %s", self.output_file)
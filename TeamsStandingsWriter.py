@@ -37,15 +37,12 @@ class TeamsStandingsWriter(TableWriter):
         return lines_buffer
 
     def _generate_driver_row(self, driver):
-        driver_info = self.championship.series_drivers_table.loc[driver]
-        driver_num = driver_info["number"]
+        driver_num = self.render_cache.driver_numbers[driver]
         standing_row_driver_num = self.standing_row_driver_num_format.format(driver_num_width=self.driver_num_width,
                                                                              driver_num=driver_num)
         return standing_row_driver_num + self._generate_standing_row_results_list(driver)
 
     def _generate_table_rows(self):
-        lines_buffer = []
-
         for pos, team in enumerate(self.championship.teams_totals_table.index):
             pos += 1
 
@@ -77,13 +74,11 @@ class TeamsStandingsWriter(TableWriter):
             team_row_substrings.append(team_row_points)
 
             team_row = "".join(team_row_substrings)
-            lines_buffer.append(team_row)
+            yield team_row
 
             # the remaining drivers results go on their own rows
             for driver in drivers_list[1:]:
-                lines_buffer.append(self._generate_driver_row(driver))
-
-        return lines_buffer
+                yield self._generate_driver_row(driver)
 
 
 if __name__ == "__main__":
@@ -1,33 +1,75 @@
+import hashlib
+import io
 import os
 
+import numpy as np
 import pandas as pd
 
+from FileUtils import get_file_hash, get_results_file, get_series_input_hashes, open_atomic, write_lines  # noqa: F401
+
 NO_TEAM = "Independent"  # drivers without teams are in the "Independent" team
 
 
-# Read series drivers info
-def read_drivers_table(series_directory):
-    drivers_table_file = os.path.join(series_directory, "drivers_table.csv")
-    table = pd.read_csv(drivers_table_file, dtype=object)
+# Parsed series tables by (cleaning function, file contents hash), so identical tables are parsed once per process
+_parsed_tables = {}
+
+
+# Read a series csv table and clean it, callers get a copy so the shared parsed table is never modified
+def _read_series_table(table_file, clean_table):
+    with open(table_file, "rb") as fp:
+        contents = fp.read()
+    key = (clean_table.__name__, hashlib.sha256(contents).hexdigest())
+    if key not in _parsed_tables:
+        _parsed_tables[key] = clean_table(pd.read_csv(io.BytesIO(contents), dtype=object))
+    return _parsed_tables[key].copy()
+
+
+def _clean_drivers_table(table):
     table = table.set_index("ign")
     return table
 
 
-# Read series points scoring info
-def read_scoring_table(series_directory):
-    points_table_file = os.path.join(series_directory, "points_table.csv")
-    table = pd.read_csv(points_table_file, dtype=object)
+def _clean_scoring_table(table):
     table = table.astype(int)
     table = table.set_index("pos")
     return table
 
 
-# Read series track info (used only for championship table)
-def read_tracks_table(series_directory):
-    tracks_table_file = os.path.join(series_directory, "tracks_table.csv")
-    table = pd.read_csv(tracks_table_file, dtype=object)
+def _clean_tracks_table(table):
     table["csv_manual_adjustment"] = table["csv_manual_adjustment"].astype(int)
     table = table.set_index("directory")
     return table
 
+
+# Read series drivers info
+def read_drivers_table(series_directory):
+    drivers_table_file = os.path.join(series_directory, "drivers_table.csv")
+    return _read_series_table(drivers_table_file, _clean_drivers_table)
+
+
+# Read series points scoring info
+def read_scoring_table(series_directory):
+    return read_scoring_table_file(os.path.join(series_directory, "points_table.csv"))
+
+
+# Read points scoring info from a csv with the columns of a series' points_table.csv
+def read_scoring_table_file(points_table_file):
+    return _read_series_table(points_table_file, _clean_scoring_table)
+
+
+# Read series track info (used only for championship table)
+def read_tracks_table(series_directory):
+    tracks_table_file = os.path.join(series_directory, "tracks_table.csv")
+    return _read_series_table(tracks_table_file, _clean_tracks_table)
+
+
+# Row order of a standings table, most points first with ties broken by countback (most wins, then most 2nds, ...)
+# countback_matrix has a row per standings row and a column per finishing position, rows tied on both stay in their
+# order, or in reverse order with reverse_ties as drivers always have been
+def get_standings_order(totals, countback_matrix, reverse_ties=False):
+    num_rows, num_positions = countback_matrix.shape
+    sort_keys = [-np.arange(num_rows) if reverse_ties else np.arange(num_rows)] + [-countback_matrix[:, pos] for pos in range(num_positions - 1, -1, -1)] + [
+        -np.asarray(totals)]
+    return np.lexsort(sort_keys)
+
 # TODO testing utility with known series and output?
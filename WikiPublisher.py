@@ -0,0 +1,215 @@
+import argparse
+import base64
+import hashlib
+import http.client
+import json
+import logging
+import os
+import queue
+import sys
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import FileUtils
+
+logger = logging.getLogger(__name__)
+
+# Page names of the standings tables under a series' wiki space, race reports are published as pages named after their
+# round directory
+standings_page_names = {"drivers_standings.txt": "Drivers Standings",
+                        "teams_standings.txt": "Teams Standings",
+                        "summary_table.txt": "Summary",
+                        "participation_table.txt": "Participation"}
+
+
+class WikiPublisher:
+    default_record_file_name = ".simresults_published.json"
+
+    # Pushes outputs to XWiki pages through its REST API, up to max_connections pages at once over as many kept alive
+    # connections that are reused between pages, url is the wiki's root (e.x. "https://xwiki.example.org/xwiki")
+    def __init__(self, url, wiki="xwiki", user=None, password=None, max_connections=4, timeout=30):
+        split_url = urllib.parse.urlsplit(url)
+        assert split_url.scheme in ["http", "https"], "wiki url must be http or https: {}".format(url)
+        assert max_connections >= 1, "max_connections must be at least 1"
+        self.url = url.rstrip("/")
+        self.wiki = wiki
+        self.max_connections = max_connections
+        self.timeout = timeout
+
+        self._connection_class = http.client.HTTPSConnection if split_url.scheme == "https" else \
+            http.client.HTTPConnection
+        self._host = split_url.netloc
+        self._base_path = split_url.path.rstrip("/")
+        self._headers = {"Content-Type": "application/x-www-form-urlencoded; charset=utf-8",
+                         "Accept": "application/xml"}
+        if user is not None:
+            credentials = base64.b64encode("{}:{}".format(user, password or "").encode()).decode()
+            self._headers["Authorization"] = "Basic {}".format(credentials)
+
+        # idle connections, a connection is taken by one upload at a time and put back once its response is read
+        self._idle_connections = queue.LifoQueue()
+
+    # REST path of a page given as its spaces and name separated by "/" (e.x. "Series/MX5/Drivers Standings")
+    def get_page_path(self, page):
+        page_parts = page.split("/")
+        assert len(page_parts) >= 2 and all(page_parts), "page {} should be spaces and a name separated by /".format(
+            page)
+        spaces_path = "".join("/spaces/{}".format(urllib.parse.quote(space, safe="")) for space in page_parts[:-1])
+        return "{}/rest/wikis/{}{}/pages/{}".format(self._base_path, urllib.parse.quote(self.wiki, safe=""),
+                                                    spaces_path, urllib.parse.quote(page_parts[-1], safe=""))
+
+    def get_page_url(self, page):
+        split_url = urllib.parse.urlsplit(self.url)
+        return "{}://{}{}".format(split_url.scheme, split_url.netloc, self.get_page_path(page))
+
+    # Send a request on an idle connection, or a new one when none are idle or new_connection
+    # The connection goes back to the idle connections once its response is read, or is closed on any error
+    def _request(self, method, path, body, new_connection=False):
+        connection = None
+        if not new_connection:
+            try:
+                connection = self._idle_connections.get_nowait()
+            except queue.Empty:
+                pass
+        if connection is None:
+            connection = self._connection_class(self._host, timeout=self.timeout)
+
+        try:
+            connection.request(method, path, body=body, headers=self._headers)
+            response = connection.getresponse()
+            response_body = response.read()
+        except Exception:
+            connection.close()
+            raise
+        self._idle_connections.put(connection)
+        return response.status, response_body
+
+    # Create or replace a page's content, XWiki answers 201 for a new page, 202 for an updated one and 304 for one
+    # that was already the same
+    def put_page(self, page, content):
+        path = self.get_page_path(page)
+        body = urllib.parse.urlencode({"title": page.split("/")[-1], "content": content}).encode()
+        try:
+            status, response_body = self._request("PUT", path, body)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # the server may close a kept alive connection while it's idle, so retry once on a new connection
+            logger.debug("retrying on a new connection: %s", page)
+            status, response_body = self._request("PUT", path, body, new_connection=True)
+
+        if status not in [200, 201, 202, 204, 304]:
+            raise http.client.HTTPException("PUT {} answered {}: {}".format(path, status, response_body[:200].decode(
+                errors="replace")))
+        logger.debug("put page %s: %d", page, status)
+        return status
+
+    def close(self):
+        while not self._idle_connections.empty():
+            self._idle_connections.get_nowait().close()
+
+    # Push the series outputs mapped to pages, by output file relative to the series directory, whose contents changed
+    # since they were last published to the same page, returns the pages published, unchanged and failed with errors
+    def publish(self, series_directory, pages, force=False, record_file_name=default_record_file_name):
+        record_file = os.path.join(series_directory, record_file_name)
+        published_hashes = {}
+        if os.path.isfile(record_file):
+            with open(record_file) as fp:
+                published_hashes = json.load(fp)
+
+        pages_to_push = []
+        unchanged_pages = []
+        for output_name, page in pages.items():
+            output_file = os.path.join(series_directory, output_name)
+            if not os.path.isfile(output_file):
+                logger.warning("no output to publish: %s", output_file)
+                continue
+            with open(output_file, encoding="utf-8") as fp:
+                content = fp.read()
+            content_hash = hashlib.sha256(content.encode()).hexdigest()
+            if not force and published_hashes.get(self.get_page_url(page)) == content_hash:
+                unchanged_pages.append(page)
+                continue
+            pages_to_push.append((page, content, content_hash))
+
+        published_pages = []
+        failed_pages = []
+        logger.info("publishing %d pages to %s, %d unchanged", len(pages_to_push), self.url, len(unchanged_pages))
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            futures = [executor.submit(self.put_page, page, content) for page, content, _ in pages_to_push]
+            for (page, _, content_hash), future in zip(pages_to_push, futures):
+                try:
+                    future.result()
+                except (OSError, http.client.HTTPException) as e:
+                    failed_pages.append((page, "{}: {}".format(type(e).__name__, e)))
+                    continue
+                published_hashes[self.get_page_url(page)] = content_hash
+                published_pages.append(page)
+                logger.info("published page: %s", page)
+
+        with FileUtils.open_atomic(record_file) as fp:
+            json.dump(published_hashes, fp, indent=2, sort_keys=True)
+        return published_pages, unchanged_pages, failed_pages
+
+
+# Standings tables and every round's race report as pages in a series' space (e.x. "Series/MX5")
+def get_default_pages(series_directory, space):
+    pages = {output_name: "{}/{}".format(space, page_name) for output_name, page_name in standings_page_names.items()}
+    for track, _ in FileUtils.read_tracks_rounds(series_directory):
+        pages[os.path.join(track, "wiki_tables.txt")] = "{}/{}".format(space, track)
+    return pages
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Publish a series' generated standings tables and race reports to XWiki pages through its REST API, only pushing pages whose content changed since they were last published.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    required_args = parser.add_argument_group(title="Required Arguments")
+    required_args.add_argument("--series", required=True, type=str,
+                               help='Name of directory containing series data and its generated tables. (e.x. "simresults/MX5")')
+    required_args.add_argument("--url", required=True, type=str,
+                               help='Root URL of the wiki. (e.x. "https://xwiki.phoenix-racing-club.org/xwiki")')
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--space", type=str,
+                               help='Space to publish the standings tables and a page per round in, separated by / for nested spaces. (e.x. "Series/MX5")')
+    optional_args.add_argument("--pages", type=str,
+                               help='JSON file mapping output files, relative to the series directory, to pages to publish them to, overriding --space pages. (e.x. {"summary_table.txt": "Series/MX5/Results"})')
+    optional_args.add_argument("--wiki", type=str, default="xwiki", help="Name of the wiki on the XWiki server.")
+    optional_args.add_argument("--user", type=str,
+                               help="User to publish as, the password is read from the XWIKI_PASSWORD environment variable.")
+    optional_args.add_argument("--jobs", type=int, default=4,
+                               help="Number of pages uploaded at once, each over its own reused connection.")
+    optional_args.add_argument("--force", action="store_true",
+                               help="Push every page, even ones whose content was already published.")
+
+    return parser.parse_args()
+
+
+def run(args):
+    pages = {}
+    if args.space:
+        pages.update(get_default_pages(args.series, args.space))
+    if args.pages:
+        with open(args.pages) as fp:
+            pages.update(json.load(fp))
+    assert pages, "no pages to publish, give a --space or --pages"
+
+    publisher = WikiPublisher(args.url, args.wiki, args.user, os.environ.get("XWIKI_PASSWORD"), args.jobs)
+    try:
+        published_pages, unchanged_pages, failed_pages = publisher.publish(args.series, pages, args.force)
+    finally:
+        publisher.close()
+
+    print("published pages:")
+    for page in published_pages:
+        print("  {}".format(page))
+    for page, error in failed_pages:
+        print("  {}: FAILED {}".format(page, error))
+    print("{} published, {} unchanged, {} failed".format(len(published_pages), len(unchanged_pages),
+                                                         len(failed_pages)))
+    return len(failed_pages)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(1 if run(parse_args()) else 0)
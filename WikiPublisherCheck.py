@@ -0,0 +1,132 @@
+import argparse
+import http.server
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import urllib.parse
+
+from WikiPublisher import WikiPublisher
+
+
+class MockWikiServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    # Answers PUTs to XWiki REST page paths like XWiki does, 201 for a new page and 202 for an updated one, or 500 for
+    # the paths in failing_paths, and records the client address every request came in on
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), MockWikiRequestHandler)
+        self.url = "http://127.0.0.1:{}/xwiki".format(self.server_address[1])
+        self.pages = {}
+        self.failing_paths = set()
+        self.requests = []
+        self.lock = threading.Lock()
+
+
+class MockWikiRequestHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests, so the publisher's connection reuse can be seen
+    protocol_version = "HTTP/1.1"
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content = urllib.parse.parse_qs(body.decode()).get("content", [""])[0]
+        with self.server.lock:
+            self.server.requests.append((self.path, self.client_address))
+            if self.path in self.server.failing_paths:
+                status = 500
+            else:
+                status = 202 if self.path in self.server.pages else 201
+                self.server.pages[self.path] = content
+
+        response_body = b"<page/>"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Check WikiPublisher against a local mock of the XWiki REST API: pages are uploaded over reused connections, unchanged pages aren't pushed again, and a page the server fails is reported as failed.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    optional_args = parser.add_argument_group(title="Optional Arguments")
+    optional_args.add_argument("--pages", type=int, default=12, help="Number of pages to publish.")
+    optional_args.add_argument("--jobs", type=int, default=4,
+                               help="Number of pages uploaded at once, and so the most connections that may be opened.")
+
+    return parser.parse_args()
+
+
+# Output files of a fake series mapped to their pages in a Series/Check space
+def write_outputs(series_directory, num_pages):
+    pages = {}
+    for i in range(num_pages):
+        output_name = "output_{:02d}.txt".format(i)
+        with open(os.path.join(series_directory, output_name), "w", encoding="utf-8") as fp:
+            fp.write("|=Pos|=Driver\n|{}|Driver {}\n".format(i + 1, i))
+        pages[output_name] = "Series/Check/Page {}".format(i)
+    return pages
+
+
+def check(failures, passed, message):
+    print("{}: {}".format("ok" if passed else "FAILED", message))
+    if not passed:
+        failures.append(message)
+
+
+def run(args):
+    failures = []
+    series_directory = tempfile.mkdtemp(prefix="simresults_wiki_check_")
+    server = MockWikiServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    publisher = WikiPublisher(server.url, max_connections=args.jobs)
+    try:
+        pages = write_outputs(series_directory, args.pages)
+
+        published_pages, unchanged_pages, failed_pages = publisher.publish(series_directory, pages)
+        connections = {client_address for _, client_address in server.requests}
+        check(failures, len(published_pages) == args.pages and not failed_pages,
+              "first publish pushed {} of {} pages".format(len(published_pages), args.pages))
+        check(failures, len(server.pages) == args.pages, "server received {} pages".format(len(server.pages)))
+        check(failures, len(connections) <= args.jobs,
+              "{} pages were pushed over {} connections, at most {} expected".format(len(server.requests),
+                                                                                    len(connections), args.jobs))
+
+        num_requests = len(server.requests)
+        published_pages, unchanged_pages, failed_pages = publisher.publish(series_directory, pages)
+        check(failures, not published_pages and len(unchanged_pages) == args.pages and len(
+            server.requests) == num_requests, "unchanged publish pushed {} pages, {} unchanged".format(
+            len(server.requests) - num_requests, len(unchanged_pages)))
+
+        changed_output, changed_page = sorted(pages.items())[0]
+        with open(os.path.join(series_directory, changed_output), "a", encoding="utf-8") as fp:
+            fp.write("|{}|Driver new\n".format(args.pages + 1))
+        server.failing_paths.add(publisher.get_page_path(changed_page))
+        published_pages, unchanged_pages, failed_pages = publisher.publish(series_directory, pages)
+        check(failures, [page for page, _ in failed_pages] == [changed_page] and not published_pages and "500" in
+              failed_pages[0][1], "page answered 500 reported as failed: {}".format(failed_pages))
+
+        server.failing_paths.clear()
+        published_pages, unchanged_pages, failed_pages = publisher.publish(series_directory, pages)
+        check(failures, published_pages == [changed_page] and not failed_pages,
+              "failed page pushed again once the server recovers: {}".format(published_pages))
+    finally:
+        publisher.close()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(series_directory)
+
+    print("{} checks failed".format(len(failures)) if failures else "all checks passed")
+    return len(failures)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    sys.exit(1 if run(parse_args()) else 0)